@@ -3,28 +3,65 @@
 from __future__ import annotations
 
 import logging
-import csv
 import os
 import re
-from datetime import datetime, timedelta
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.exceptions import HomeAssistantError, Unauthorized
 from homeassistant.util.dt import now as dt_now
-from homeassistant.util import dt as dt_util
 from homeassistant.helpers.storage import Store
+from homeassistant.helpers.event import (
+    TrackStates,
+    async_track_state_change_filtered,
+)
+import voluptuous as vol
 
-from .websocket import async_register as async_register_ws
-from .sensor import FreeDrinkFeedSensor
-from .security import hash_pin, verify_pin
-from .utils import get_person_name
-from .config_flow import _log_price_change
+from .websocket import BATCH_ITEM_SCHEMA, async_register as async_register_ws
+from .sensor import FreeDrinkFeedSensor, async_schedule_sensor_updates
+from .ledger import (
+    LEDGER_STORAGE_KEY,
+    LEDGER_STORAGE_VERSION,
+    add_count,
+    forget_user,
+    ledger_document,
+    load_entry,
+    refresh_totals,
+    reset_entry,
+    set_count,
+    set_credit,
+)
+from .export import (
+    EXPORT_FORMATS,
+    cleanup_backups,
+    export_logs,
+    export_rows,
+    write_backup,
+)
+from .journal import LedgerJournal
+from .locks import all_users, async_lock_users, discard_user_lock
+from .log_writer import LogWriter
+from .security import PinVerificationCache, async_hash_pin
+from .utils import (
+    build_person_cache,
+    find_user_entry,
+    get_user_permissions,
+    refresh_access_lists,
+    read_last_csv_row,
+    register_user_entry,
+    rewrite_csv_tail,
+    unregister_user_entry,
+    update_person_cache,
+    user_entries,
+)
+from .config_flow import TallyListConfigFlow, _log_price_change, _log_time
 
 from .const import (
     DOMAIN,
     SERVICE_ADD_DRINK,
+    SERVICE_ADD_DRINKS_BATCH,
     SERVICE_REMOVE_DRINK,
     SERVICE_SET_DRINK,
     SERVICE_RESET_COUNTERS,
@@ -35,7 +72,9 @@ from .const import (
     SERVICE_SET_CREDIT,
     ATTR_USER,
     ATTR_DRINK,
+    ATTR_ITEMS,
     CONF_USER,
+    CONF_DRINKS,
     CONF_FREE_AMOUNT,
     CONF_EXCLUDED_USERS,
     CONF_OVERRIDE_USERS,
@@ -85,6 +124,26 @@ async def _async_update_feed_sensor(hass: HomeAssistant) -> None:
         add_entities([sensor])
 
 
+def _format_booking_details(bookings) -> str:
+    """Format ``(user, drink, count)`` bookings for the price list log.
+
+    Counts of the same user and drink are summed and the user name is only
+    repeated when it changes, e.g. ``Alice:Beer+2,Soda+1,Bob:Beer+1``.
+    """
+    totals: dict[tuple[str, str], int] = {}
+    for user, drink, count in bookings:
+        totals[(user, drink)] = totals.get((user, drink), 0) + count
+    parts: list[str] = []
+    last_user: str | None = None
+    for (user, drink), count in totals.items():
+        token = f"{drink}+{count}"
+        if user != last_user:
+            token = f"{user}:{token}"
+            last_user = user
+        parts.append(token)
+    return ",".join(parts)
+
+
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up via YAML is not supported."""
     hass.data.setdefault(
@@ -114,28 +173,76 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     hass.data[DOMAIN]["pins_store"] = store
     stored_pins = await store.async_load() or {}
     hass.data[DOMAIN][CONF_USER_PINS] = stored_pins
+    hass.data[DOMAIN]["pin_cache"] = PinVerificationCache()
 
-    async def _verify_permissions(call, target_user: str | None) -> None:
+    ledger_store = Store(
+        hass, LEDGER_STORAGE_VERSION, LEDGER_STORAGE_KEY, private=True
+    )
+    hass.data[DOMAIN]["ledger_store"] = ledger_store
+    stored_ledger = await ledger_store.async_load() or {}
+    hass.data[DOMAIN]["ledger_users"] = stored_ledger.get("users", {})
+    journal = LedgerJournal(
+        hass,
+        hass.config.path(".storage", f"{LEDGER_STORAGE_KEY}.journal"),
+        ledger_store,
+        lambda: ledger_document(hass),
+    )
+    hass.data[DOMAIN]["ledger_journal"] = journal
+    await journal.async_replay(
+        hass.data[DOMAIN]["ledger_users"], stored_ledger.get("seq", 0)
+    )
+
+    log_writer = LogWriter(hass)
+    hass.data[DOMAIN]["log_writer"] = log_writer
+
+    async def _async_flush_journal(event) -> None:
+        try:
+            await log_writer.async_flush()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Failed to flush logs on shutdown")
+        await journal.async_flush()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_flush_journal)
+
+    build_person_cache(hass)
+
+    @callback
+    def _async_person_changed(event) -> None:
+        update_person_cache(
+            hass, event.data.get("old_state"), event.data.get("new_state")
+        )
+
+    async_track_state_change_filtered(
+        hass, TrackStates(False, set(), {"person"}), _async_person_changed
+    )
+
+    async def _verify_permissions(
+        call, target_user: str | None, pin: str | None = None
+    ) -> None:
         user_id = call.context.user_id
         if user_id is None:
             return
-        hass_user = await hass.auth.async_get_user(user_id)
-        if hass_user is None:
-            return
-        override_users = hass.data.get(DOMAIN, {}).get(CONF_OVERRIDE_USERS, [])
-        public_devices = hass.data.get(DOMAIN, {}).get(CONF_PUBLIC_DEVICES, [])
-        user_pins = hass.data.get(DOMAIN, {}).get(CONF_USER_PINS, {})
-        logins = hass.data.get(DOMAIN, {}).get("logins", {})
-        person_name = get_person_name(hass, hass_user.id)
-        if person_name in override_users:
+        permissions = get_user_permissions(hass, user_id)
+        if permissions is None:
+            # Users without a person are rare; only they need the auth
+            # lookup, and unknown users are let through as before.
+            if await hass.auth.async_get_user(user_id) is None:
+                return
+            permissions = {"name": None, "admin": False, "public": False}
+        if permissions["admin"]:
             return
-        if person_name in public_devices and target_user:
+        person_name = permissions["name"]
+        if permissions["public"] and target_user:
+            user_pins = hass.data.get(DOMAIN, {}).get(CONF_USER_PINS, {})
+            logins = hass.data.get(DOMAIN, {}).get("logins", {})
             user_pin = user_pins.get(target_user)
-            provided_pin = call.data.get(ATTR_PIN)
+            provided_pin = pin if pin is not None else call.data.get(ATTR_PIN)
             verified = (
                 provided_pin is not None
                 and user_pin is not None
-                and verify_pin(str(provided_pin), user_pin)
+                and await hass.data[DOMAIN]["pin_cache"].async_verify(
+                    hass, user_id, target_user, str(provided_pin), user_pin
+                )
             )
             if user_pin and (verified or logins.get(user_id) == target_user):
                 return
@@ -144,25 +251,26 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         if person_name != target_user:
             raise Unauthorized
 
-    def _write_free_drink_log(name: str, drink: str, count: int, comment: str) -> None:
-        tz = dt_util.get_time_zone("Europe/Berlin")
-        ts = dt_util.now(tz).replace(second=0, microsecond=0)
+    def _write_free_drink_log(
+        name: str, drink: str, count: int, comment: str, ts=None
+    ) -> None:
+        if ts is None:
+            ts = _log_time()
         base_dir = hass.config.path("tally_list", "free_drinks")
         os.makedirs(base_dir, exist_ok=True)
         year = ts.strftime("%Y")
         path = os.path.join(base_dir, f"free_drinks_{year}.csv")
         key_time = ts.strftime("%Y-%m-%dT%H:%M")
         comment_clean = re.sub(r"[\n\r\t]", " ", comment).strip()[:200]
-        rows: list[list[str]] = []
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8", newline="") as csvfile:
-                rows = list(csv.reader(csvfile, delimiter=";"))
-        if not rows:
-            rows = [["Uhrzeit", "Name", "Getränke mit Anzahl", "Kommentar"]]
+        offset, last = (
+            read_last_csv_row(path) if os.path.exists(path) else (0, None)
+        )
+        rows: list[list[str]] = [last] if last is not None else [
+            ["Uhrzeit", "Name", "Getränke mit Anzahl", "Kommentar"]
+        ]
         last_key = None
-        if len(rows) > 1:
-            last = rows[-1]
-            last_key = (last[0], last[1], last[3])
+        if offset > 0 and len(rows[-1]) == 4:
+            last_key = (rows[-1][0], rows[-1][1], rows[-1][3])
         key = (key_time, name, comment_clean)
         if key == last_key:
             drink_map: dict[str, int] = {}
@@ -182,19 +290,20 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         else:
             drink_str = f"{drink} x{count}"
             rows.append([key_time, name, drink_str, comment_clean])
-        with open(path, "w", encoding="utf-8", newline="") as csvfile:
-            writer = csv.writer(csvfile, delimiter=";", quoting=csv.QUOTE_MINIMAL)
-            writer.writerows(rows)
-
-    def _find_user_entry(name: str) -> dict | None:
-        for data in hass.data[DOMAIN].values():
-            if (
-                isinstance(data, dict)
-                and "entry" in data
-                and data["entry"].data.get(CONF_USER) == name
-            ):
-                return data
-        return None
+        rewrite_csv_tail(path, offset, rows)
+
+    def _queue_free_drink_log(
+        name: str, drink: str, count: int, comment: str
+    ) -> None:
+        hass.data[DOMAIN]["log_writer"].queue(
+            _write_free_drink_log,
+            name,
+            drink,
+            count,
+            comment,
+            _log_time(),
+            refresh=_async_update_feed_sensor,
+        )
 
     def _find_cash_entry() -> dict:
         cash_name = hass.data[DOMAIN].get(CONF_CASH_USER_NAME)
@@ -202,18 +311,9 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
             raise HomeAssistantError(
                 translation_domain=DOMAIN, translation_key="cash_user_missing"
             )
-        entry = _find_user_entry(cash_name)
-        if entry is None:
-            cash_name_norm = cash_name.strip().lower()
-            for data in hass.data[DOMAIN].values():
-                if (
-                    isinstance(data, dict)
-                    and "entry" in data
-                    and data["entry"].data.get(CONF_USER, "").strip().lower()
-                    == cash_name_norm
-                ):
-                    entry = data
-                    break
+        entry = find_user_entry(hass, cash_name) or find_user_entry(
+            hass, cash_name, normalized=True
+        )
         if entry is None:
             raise HomeAssistantError(
                 translation_domain=DOMAIN, translation_key="cash_user_missing"
@@ -224,20 +324,18 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         user_id = call.context.user_id
         if user_id is None:
             raise Unauthorized
-        hass_user = await hass.auth.async_get_user(user_id)
-        if hass_user is None:
-            raise Unauthorized
-        person_name = get_person_name(hass, hass_user.id)
-        if person_name is None:
+        permissions = get_user_permissions(hass, user_id)
+        if permissions is None:
+            if await hass.auth.async_get_user(user_id) is None:
+                raise Unauthorized
             raise HomeAssistantError(
                 translation_domain=DOMAIN, translation_key="user_unknown"
             )
+        person_name = permissions["name"]
 
         target_user = call.data.get(ATTR_USER, person_name)
-        if target_user != person_name:
-            override_users = hass.data.get(DOMAIN, {}).get(CONF_OVERRIDE_USERS, [])
-            if person_name not in override_users:
-                raise Unauthorized
+        if target_user != person_name and not permissions["admin"]:
+            raise Unauthorized
 
         pin = call.data.get(ATTR_PIN)
         user_pins = hass.data[DOMAIN].setdefault(CONF_USER_PINS, {})
@@ -248,9 +346,10 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
                 raise HomeAssistantError(
                     translation_domain=DOMAIN, translation_key="invalid_pin"
                 )
-            user_pins[target_user] = hash_pin(pin)
+            user_pins[target_user] = await async_hash_pin(hass, pin)
         else:
             user_pins.pop(target_user, None)
+        hass.data[DOMAIN]["pin_cache"].invalidate(target_user)
         try:
             await hass.data[DOMAIN]["pins_store"].async_save(user_pins)
         except Exception as err:  # pylint: disable=broad-except
@@ -271,18 +370,12 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
 
     async def set_drink_service(call):
         user = call.data[ATTR_USER]
-        await _verify_permissions(call, user)
         drink = call.data[ATTR_DRINK]
         count = max(0, call.data.get("count", 0))
-        for entry_id, data in hass.data[DOMAIN].items():
-            if not isinstance(data, dict) or "entry" not in data:
-                continue
-            if data["entry"].data.get("user") == user:
-                counts = data.setdefault("counts", {})
-                counts[drink] = count
-                for sensor in data.get("sensors", []):
-                    await sensor.async_update_state()
-                break
+        data = find_user_entry(hass, user)
+        if data is not None:
+            set_count(hass, data, drink, count)
+            async_schedule_sensor_updates(hass, data.get("sensors", []))
         await _log_price_change(
             hass,
             call.context.user_id,
@@ -290,76 +383,121 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
             f"{user}:{drink}={count}",
         )
 
-    async def add_drink_service(call):
-        user = call.data[ATTR_USER]
-        await _verify_permissions(call, user)
-        drink = call.data[ATTR_DRINK]
-        count = max(0, call.data.get("count", 1))
-        free_drink = call.data.get(ATTR_FREE_DRINK, False)
-        comment = call.data.get(ATTR_COMMENT, "")
-        entry = _find_user_entry(user)
-        if entry is None:
+    def _validate_booking(
+        user: str, drink: str, free_drink: bool, comment: str
+    ) -> str:
+        """Validate a drink booking and return the cleaned comment."""
+        if find_user_entry(hass, user) is None:
             raise HomeAssistantError(
                 translation_domain=DOMAIN, translation_key="user_unknown"
             )
-        if free_drink:
-            if not hass.data[DOMAIN].get(CONF_ENABLE_FREE_DRINKS):
-                raise HomeAssistantError(
-                    translation_domain=DOMAIN,
-                    translation_key="free_drinks_disabled",
-                )
-            comment = comment.strip()
-            if len(comment) < 3 or len(comment) > 200:
-                raise HomeAssistantError(
-                    translation_domain=DOMAIN, translation_key="comment_required"
-                )
-            if drink not in hass.data[DOMAIN].get("drinks", {}):
-                raise HomeAssistantError(
-                    translation_domain=DOMAIN, translation_key="drink_unknown"
-                )
-            cash_entry = _find_cash_entry()
-            counts = cash_entry.setdefault("counts", {})
-            counts[drink] = counts.get(drink, 0) + count
-            hass.data[DOMAIN]["free_drink_counts"] = counts
-            for sensor in cash_entry.get("sensors", []):
-                await sensor.async_update_state()
-            price = hass.data[DOMAIN]["drinks"].get(drink, 0.0)
-            hass.data[DOMAIN]["free_drinks_ledger"] = hass.data[DOMAIN].get(
-                "free_drinks_ledger", 0.0
-            ) + price * count
+        if not free_drink:
+            return comment
+        if not hass.data[DOMAIN].get(CONF_ENABLE_FREE_DRINKS):
+            raise HomeAssistantError(
+                translation_domain=DOMAIN,
+                translation_key="free_drinks_disabled",
+            )
+        comment = comment.strip()
+        if len(comment) < 3 or len(comment) > 200:
+            raise HomeAssistantError(
+                translation_domain=DOMAIN, translation_key="comment_required"
+            )
+        if drink not in hass.data[DOMAIN].get("drinks", {}):
+            raise HomeAssistantError(
+                translation_domain=DOMAIN, translation_key="drink_unknown"
+            )
+        _find_cash_entry()
+        return comment
+
+    async def _async_book_drinks(
+        call, bookings: list[tuple[str, str, int, bool, str]]
+    ) -> None:
+        """Apply validated bookings and flush sensors and logs once."""
+        touched: dict[int, dict] = {}
+        paid: list[tuple[str, str, int]] = []
+        free: list[tuple[str, str, int, str]] = []
+        for user, drink, count, free_drink, comment in bookings:
+            if free_drink:
+                target = _find_cash_entry()
+                add_count(hass, target, drink, count)
+                hass.data[DOMAIN]["free_drink_counts"] = target["counts"]
+                price = hass.data[DOMAIN]["drinks"].get(drink, 0.0)
+                hass.data[DOMAIN]["free_drinks_ledger"] = hass.data[DOMAIN].get(
+                    "free_drinks_ledger", 0.0
+                ) + price * count
+                free.append((user, drink, count, comment))
+            else:
+                target = find_user_entry(hass, user)
+                add_count(hass, target, drink, count)
+                paid.append((user, drink, count))
+            touched[id(target)] = target
+        for data in touched.values():
+            async_schedule_sensor_updates(hass, data.get("sensors", []))
+        if free:
             if hass.data.get(DOMAIN, {}).get(CONF_ENABLE_LOGGING, True) and hass.data[DOMAIN].get(
                 CONF_LOG_FREE_DRINKS, True
             ):
-                await hass.async_add_executor_job(
-                    _write_free_drink_log, user, drink, count, comment
+                for name, drink, count, comment in free:
+                    _queue_free_drink_log(name, drink, count, comment)
+            else:
+                await _async_update_feed_sensor(hass)
+            for user, drink, count, comment in free:
+                hass.bus.async_fire(
+                    "tally_list_free_drink_created",
+                    {"user": user, "drink": drink, "count": count, "comment": comment},
                 )
-            await _async_update_feed_sensor(hass)
-            hass.bus.async_fire(
-                "tally_list_free_drink_created",
-                {"user": user, "drink": drink, "count": count, "comment": comment},
-            )
             await _log_price_change(
                 hass,
                 call.context.user_id,
                 "add_free_drink",
-                f"{user}:{drink}+{count}",
+                _format_booking_details(
+                    (user, drink, count) for user, drink, count, _ in free
+                ),
             )
-            return
-        counts = entry.setdefault("counts", {})
-        new_count = counts.get(drink, 0) + count
-        counts[drink] = new_count
-        for sensor in entry.get("sensors", []):
-            await sensor.async_update_state()
-        await _log_price_change(
-            hass,
-            call.context.user_id,
-            "add_drink",
-            f"{user}:{drink}+{count}",
+        if paid:
+            await _log_price_change(
+                hass,
+                call.context.user_id,
+                "add_drink",
+                _format_booking_details(paid),
+            )
+
+    async def add_drink_service(call):
+        user = call.data[ATTR_USER]
+        drink = call.data[ATTR_DRINK]
+        count = max(0, call.data.get("count", 1))
+        free_drink = call.data.get(ATTR_FREE_DRINK, False)
+        comment = _validate_booking(
+            user, drink, free_drink, call.data.get(ATTR_COMMENT, "")
         )
+        await _async_book_drinks(call, [(user, drink, count, free_drink, comment)])
+
+    def _batch_items(call) -> list[dict]:
+        """Return the validated items of an add_drinks_batch call."""
+        try:
+            return [
+                BATCH_ITEM_SCHEMA(item) for item in call.data.get(ATTR_ITEMS) or []
+            ]
+        except vol.Invalid as err:
+            raise HomeAssistantError(
+                translation_domain=DOMAIN, translation_key="invalid_booking"
+            ) from err
+
+    async def add_drinks_batch_service(call):
+        bookings: list[tuple[str, str, int, bool, str]] = []
+        for item in _batch_items(call):
+            user = item[ATTR_USER]
+            drink = item[ATTR_DRINK]
+            count = item["count"]
+            free_drink = item[ATTR_FREE_DRINK]
+            comment = _validate_booking(user, drink, free_drink, item[ATTR_COMMENT])
+            bookings.append((user, drink, count, free_drink, comment))
+        if bookings:
+            await _async_book_drinks(call, bookings)
 
     async def remove_drink_service(call):
         user = call.data[ATTR_USER]
-        await _verify_permissions(call, user)
         drink = call.data[ATTR_DRINK]
         count = max(0, call.data.get("count", 1))
         free_drink = call.data.get(ATTR_FREE_DRINK, False)
@@ -376,9 +514,8 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
                 raise HomeAssistantError(
                     translation_domain=DOMAIN, translation_key="cannot_remove_count"
                 )
-            counts[drink] -= count
-            for sensor in cash_entry.get("sensors", []):
-                await sensor.async_update_state()
+            add_count(hass, cash_entry, drink, -count)
+            async_schedule_sensor_updates(hass, cash_entry.get("sensors", []))
             price = hass.data[DOMAIN]["drinks"].get(drink, 0.0)
             hass.data[DOMAIN]["free_drinks_ledger"] = hass.data[DOMAIN].get(
                 "free_drinks_ledger", 0.0
@@ -387,10 +524,9 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
             if hass.data.get(DOMAIN, {}).get(CONF_ENABLE_LOGGING, True) and hass.data[DOMAIN].get(
                 CONF_LOG_FREE_DRINKS, True
             ):
-                await hass.async_add_executor_job(
-                    _write_free_drink_log, user, drink, -count, comment
-                )
-            await _async_update_feed_sensor(hass)
+                _queue_free_drink_log(user, drink, -count, comment)
+            else:
+                await _async_update_feed_sensor(hass)
             hass.bus.async_fire(
                 "tally_list_free_drink_reversed",
                 {"user": user, "drink": drink, "count": count, "comment": comment},
@@ -402,18 +538,14 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
                 f"{user}:{drink}-{count}",
             )
             return
-        for entry_id, data in hass.data[DOMAIN].items():
-            if not isinstance(data, dict) or "entry" not in data:
-                continue
-            if data["entry"].data.get("user") == user:
-                counts = data.setdefault("counts", {})
-                new_count = counts.get(drink, 0) - count
-                if new_count < 0:
-                    new_count = 0
-                counts[drink] = new_count
-                for sensor in data.get("sensors", []):
-                    await sensor.async_update_state()
-                break
+        data = find_user_entry(hass, user)
+        if data is not None:
+            counts = data.setdefault("counts", {})
+            new_count = counts.get(drink, 0) - count
+            if new_count < 0:
+                new_count = 0
+            set_count(hass, data, drink, new_count)
+            async_schedule_sensor_updates(hass, data.get("sensors", []))
         await _log_price_change(
             hass,
             call.context.user_id,
@@ -422,17 +554,15 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         )
 
     async def add_credit_service(call):
-        await _verify_permissions(call, None)
         user = call.data[ATTR_USER]
         amount = float(call.data.get(ATTR_AMOUNT, 0.0))
-        entry = _find_user_entry(user)
+        entry = find_user_entry(hass, user)
         if entry is None:
             raise HomeAssistantError(
                 translation_domain=DOMAIN, translation_key="user_unknown"
             )
-        entry["credit"] = entry.setdefault("credit", 0.0) + amount
-        for sensor in entry.get("sensors", []):
-            await sensor.async_update_state()
+        set_credit(hass, entry, entry.get("credit", 0.0) + amount)
+        async_schedule_sensor_updates(hass, entry.get("sensors", []))
         await _log_price_change(
             hass,
             call.context.user_id,
@@ -441,17 +571,15 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         )
 
     async def remove_credit_service(call):
-        await _verify_permissions(call, None)
         user = call.data[ATTR_USER]
         amount = float(call.data.get(ATTR_AMOUNT, 0.0))
-        entry = _find_user_entry(user)
+        entry = find_user_entry(hass, user)
         if entry is None:
             raise HomeAssistantError(
                 translation_domain=DOMAIN, translation_key="user_unknown"
             )
-        entry["credit"] = entry.setdefault("credit", 0.0) - amount
-        for sensor in entry.get("sensors", []):
-            await sensor.async_update_state()
+        set_credit(hass, entry, entry.get("credit", 0.0) - amount)
+        async_schedule_sensor_updates(hass, entry.get("sensors", []))
         await _log_price_change(
             hass,
             call.context.user_id,
@@ -460,17 +588,15 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         )
 
     async def set_credit_service(call):
-        await _verify_permissions(call, None)
         user = call.data[ATTR_USER]
         amount = float(call.data.get(ATTR_AMOUNT, 0.0))
-        entry = _find_user_entry(user)
+        entry = find_user_entry(hass, user)
         if entry is None:
             raise HomeAssistantError(
                 translation_domain=DOMAIN, translation_key="user_unknown"
             )
-        entry["credit"] = amount
-        for sensor in entry.get("sensors", []):
-            await sensor.async_update_state()
+        set_credit(hass, entry, amount)
+        async_schedule_sensor_updates(hass, entry.get("sensors", []))
         await _log_price_change(
             hass,
             call.context.user_id,
@@ -480,19 +606,20 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
 
     async def reset_counters_service(call):
         user = call.data.get(ATTR_USER)
-        await _verify_permissions(call, user)
         drinks = hass.data[DOMAIN].get("drinks", {})
-        for entry_id, data in hass.data[DOMAIN].items():
-            if not isinstance(data, dict) or "entry" not in data:
-                continue
-            if user is None or data["entry"].data.get("user") == user:
-                data["counts"] = {drink: 0 for drink in drinks}
-                data["credit"] = 0.0
-                for sensor in data.get("sensors", []):
-                    await sensor.async_update_state()
+        if user is None:
+            targets = user_entries(hass)
+        else:
+            data = find_user_entry(hass, user)
+            targets = [data] if data is not None else []
+        for data in targets:
+            reset_entry(hass, data, drinks)
+            async_schedule_sensor_updates(hass, data.get("sensors", []))
         if user is None or user == hass.data[DOMAIN].get(CONF_CASH_USER_NAME):
             hass.data[DOMAIN]["free_drink_counts"] = {}
             hass.data[DOMAIN]["free_drinks_ledger"] = 0.0
+            # Queued rows would recreate the files right after removal.
+            await hass.data[DOMAIN]["log_writer"].async_flush()
             base_dir = hass.config.path("tally_list", "free_drinks")
             if os.path.isdir(base_dir):
                 for name in os.listdir(base_dir):
@@ -512,62 +639,20 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         )
 
     async def export_csv_service(call):
-        sensors = sorted(
-            [
-                state
-                for state in hass.states.async_all("sensor")
-                if state.entity_id.endswith("_amount_due")
-            ],
-            key=lambda state: state.name.casefold(),
-        )
-        currency = hass.data.get(DOMAIN, {}).get(CONF_CURRENCY, "€")
         now = dt_now()
         base_dir = hass.config.path("tally_list")
 
-        def _write_csv(path: str) -> None:
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            with open(path, "w", newline="", encoding="utf-8") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(["Name", f"Betrag ({currency})"])
-                for state in sensors:
-                    try:
-                        amount = float(state.state)
-                    except (ValueError, TypeError):
-                        amount = 0.0
-                    name = state.name.replace(" Amount Due", "")
-                    writer.writerow([name, f"{amount:.2f}"])
-        def _cleanup(path: str, keep: int | None, unit: str) -> None:
-            if keep is None or keep <= 0:
-                return
-            if unit == "files":
-                if not os.path.isdir(path):
-                    return
-                files = [
-                    os.path.join(path, fname)
-                    for fname in os.listdir(path)
-                    if os.path.isfile(os.path.join(path, fname))
-                ]
-                files.sort(key=os.path.getmtime, reverse=True)
-                for file in files[keep:]:
-                    os.remove(file)
-                return
-            days = keep
-            if unit == "weeks":
-                days *= 7
-            elif unit == "months":
-                days *= 30
-            cutoff = now - timedelta(days=days)
-            if not os.path.isdir(path):
-                return
-            for filename in os.listdir(path):
-                file_path = os.path.join(path, filename)
-                if not os.path.isfile(file_path):
-                    continue
-                mtime = datetime.fromtimestamp(
-                    os.path.getmtime(file_path), tz=now.tzinfo
-                )
-                if mtime < cutoff:
-                    os.remove(file_path)
+        fmt = call.data.get("format", "csv")
+        if fmt not in EXPORT_FORMATS:
+            fmt = "csv"
+        ext = EXPORT_FORMATS[fmt]
+
+        async def _async_export(path: str) -> None:
+            # Rows are taken from the in-memory ledger on the loop and
+            # streamed to disk in the executor.
+            await hass.async_add_executor_job(
+                write_backup, path, export_rows(hass), now, fmt
+            )
 
         backup = call.data.get("backup")
         interval = call.data.get("interval", 1) or 1
@@ -587,11 +672,11 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
                 file_path = os.path.join(
                     base_dir,
                     "daily",
-                    f"amount_due_daily_{now.strftime('%Y-%m-%d_%H-%M')}.csv",
+                    f"amount_due_daily_{now.strftime('%Y-%m-%d_%H-%M')}{ext}",
                 )
-                await hass.async_add_executor_job(_write_csv, file_path)
+                await _async_export(file_path)
             await hass.async_add_executor_job(
-                _cleanup, os.path.join(base_dir, "daily"), keep, "days"
+                cleanup_backups, os.path.join(base_dir, "daily"), keep, "days", now
             )
         elif backup == "weekly":
             iso_year, iso_week, _ = now.isocalendar()
@@ -599,58 +684,125 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
                 weekly_file = os.path.join(
                     base_dir,
                     "weekly",
-                    f"amount_due_weekly_{iso_year}-{iso_week:02d}.csv",
+                    f"amount_due_weekly_{iso_year}-{iso_week:02d}{ext}",
                 )
                 if not os.path.exists(weekly_file):
-                    await hass.async_add_executor_job(_write_csv, weekly_file)
+                    await _async_export(weekly_file)
             await hass.async_add_executor_job(
-                _cleanup, os.path.join(base_dir, "weekly"), keep, "weeks"
+                cleanup_backups, os.path.join(base_dir, "weekly"), keep, "weeks", now
             )
         elif backup == "monthly":
             if now.month % interval == 0:
                 monthly_file = os.path.join(
                     base_dir,
                     "monthly",
-                    f"amount_due_monthly_{now.strftime('%Y-%m')}.csv",
+                    f"amount_due_monthly_{now.strftime('%Y-%m')}{ext}",
                 )
                 if not os.path.exists(monthly_file):
-                    await hass.async_add_executor_job(_write_csv, monthly_file)
+                    await _async_export(monthly_file)
             await hass.async_add_executor_job(
-                _cleanup, os.path.join(base_dir, "monthly"), keep, "months"
+                cleanup_backups, os.path.join(base_dir, "monthly"), keep, "months", now
             )
         elif backup == "manual":
             manual_file = os.path.join(
                 base_dir,
                 "manual",
-                f"amount_due_manual_{now.strftime('%Y-%m-%d_%H-%M')}.csv",
+                f"amount_due_manual_{now.strftime('%Y-%m-%d_%H-%M')}{ext}",
+            )
+            await _async_export(manual_file)
+            await hass.async_add_executor_job(
+                cleanup_backups, os.path.join(base_dir, "manual"), keep, "files", now
             )
-            await hass.async_add_executor_job(_write_csv, manual_file)
+        elif backup == "logs":
+            await hass.data[DOMAIN]["log_writer"].async_flush()
             await hass.async_add_executor_job(
-                _cleanup, os.path.join(base_dir, "manual"), keep, "files"
+                export_logs, base_dir, os.path.join(base_dir, "logs"), fmt
             )
 
+    def _locked_users(call) -> set[str]:
+        """Return the users whose ledger a service call may change."""
+        items = call.data.get(ATTR_ITEMS)
+        if items is not None:
+            items = [item for item in items if isinstance(item, dict)]
+            users = {str(item.get(ATTR_USER)) for item in items}
+            free_drink = any(item.get(ATTR_FREE_DRINK) for item in items)
+        elif call.data.get(ATTR_USER) is None:
+            # Resetting without a user resets everyone.
+            return all_users(hass)
+        else:
+            users = {call.data[ATTR_USER]}
+            free_drink = call.data.get(ATTR_FREE_DRINK, False)
+        if free_drink:
+            # Lock the cash entry under its own user name, as direct
+            # operations on that entry do.
+            cash_name = hass.data[DOMAIN].get(CONF_CASH_USER_NAME) or ""
+            cash_entry = find_user_entry(hass, cash_name) or find_user_entry(
+                hass, cash_name, normalized=True
+            )
+            if cash_entry is not None:
+                cash_name = cash_entry["entry"].data.get(CONF_USER, cash_name)
+            users.add(cash_name)
+        return users
+
+    async def _verify_target_user(call) -> None:
+        await _verify_permissions(call, call.data.get(ATTR_USER))
+
+    async def _verify_admin(call) -> None:
+        await _verify_permissions(call, None)
+
+    async def _verify_batch(call) -> None:
+        verified: set[tuple[str, str | None]] = set()
+        for item in _batch_items(call):
+            user = item[ATTR_USER]
+            pin = item.get(ATTR_PIN, call.data.get(ATTR_PIN))
+            if (user, pin) not in verified:
+                await _verify_permissions(call, user, pin)
+                verified.add((user, pin))
+
+    def _with_user_locks(handler, verify):
+        """Run ``handler`` while holding the locks of the affected users.
+
+        ``verify`` checks the permissions first, so a rejected call never
+        takes a lock and cannot stall bookings. Operations on the same user
+        are linearized until the change is logged; other users are not
+        blocked.
+        """
+
+        async def _locked(call):
+            await verify(call)
+            async with async_lock_users(hass, _locked_users(call)):
+                await handler(call)
+
+        return _locked
+
     hass.services.async_register(
         DOMAIN,
         SERVICE_ADD_DRINK,
-        add_drink_service,
+        _with_user_locks(add_drink_service, _verify_target_user),
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_ADD_DRINKS_BATCH,
+        _with_user_locks(add_drinks_batch_service, _verify_batch),
     )
 
     hass.services.async_register(
         DOMAIN,
         SERVICE_REMOVE_DRINK,
-        remove_drink_service,
+        _with_user_locks(remove_drink_service, _verify_target_user),
     )
 
     hass.services.async_register(
         DOMAIN,
         SERVICE_SET_DRINK,
-        set_drink_service,
+        _with_user_locks(set_drink_service, _verify_target_user),
     )
 
     hass.services.async_register(
         DOMAIN,
         SERVICE_RESET_COUNTERS,
-        reset_counters_service,
+        _with_user_locks(reset_counters_service, _verify_target_user),
     )
 
     hass.services.async_register(
@@ -668,19 +820,19 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     hass.services.async_register(
         DOMAIN,
         SERVICE_ADD_CREDIT,
-        add_credit_service,
+        _with_user_locks(add_credit_service, _verify_admin),
     )
 
     hass.services.async_register(
         DOMAIN,
         SERVICE_REMOVE_CREDIT,
-        remove_credit_service,
+        _with_user_locks(remove_credit_service, _verify_admin),
     )
 
     hass.services.async_register(
         DOMAIN,
         SERVICE_SET_CREDIT,
-        set_credit_service,
+        _with_user_locks(set_credit_service, _verify_admin),
     )
 
     await async_register_ws(hass)
@@ -688,6 +840,111 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     return True
 
 
+# Options shared by all entries. The runtime value is taken from the first
+# entry that has one; entries without a value get it written back.
+_SHARED_OPTIONS = (
+    ("drinks", CONF_DRINKS),
+    ("drink_icons", CONF_ICONS),
+    ("free_amount", CONF_FREE_AMOUNT),
+    (CONF_EXCLUDED_USERS, CONF_EXCLUDED_USERS),
+    (CONF_OVERRIDE_USERS, CONF_OVERRIDE_USERS),
+    (CONF_CURRENCY, CONF_CURRENCY),
+    (CONF_ENABLE_FREE_DRINKS, CONF_ENABLE_FREE_DRINKS),
+)
+# Options where the value stored in an entry replaces the runtime value.
+_ENTRY_OPTIONS = (
+    CONF_PUBLIC_DEVICES,
+    CONF_ENABLE_LOGGING,
+    CONF_LOG_DRINKS,
+    CONF_LOG_PRICE_CHANGES,
+    CONF_LOG_FREE_DRINKS,
+    CONF_LOG_PIN_SET,
+)
+
+
+def _pricing_state(domain: dict) -> tuple:
+    """Return the runtime values the totals of all users depend on."""
+    return (
+        domain.get("drinks"),
+        domain.get("free_amount"),
+        domain.get(CONF_CASH_USER_NAME),
+    )
+
+
+def _load_entry_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Copy the shared options of ``entry`` into the runtime state.
+
+    The cash user name follows the configured language. Totals already read
+    by sensors are recomputed when the prices, the free amount or the cash
+    user change, since the price list entry may be set up after user entries.
+    """
+    domain = hass.data[DOMAIN]
+    pricing = _pricing_state(domain)
+    domain[CONF_CASH_USER_NAME] = get_cash_user_name(hass.config.language)
+    for key, option in _SHARED_OPTIONS:
+        if not domain.get(key) and entry.data.get(option) is not None:
+            if option in (CONF_DRINKS, CONF_ICONS) and not entry.data[option]:
+                continue
+            domain[key] = entry.data[option]
+    for option in _ENTRY_OPTIONS:
+        if entry.data.get(option) is not None:
+            domain[option] = entry.data[option]
+    # The access lists may have been loaded from the entry above.
+    refresh_access_lists(hass)
+    if _pricing_state(domain) != pricing:
+        refresh_totals(hass)
+
+
+def _migrated_entry_data(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return the final data of ``entry`` after all migrations.
+
+    Missing shared options are filled in from the runtime state, the cash
+    user name follows the configured language and a PIN stored in the entry
+    by old versions is dropped (it lives in the PIN store).
+    """
+    domain = hass.data[DOMAIN]
+    data = dict(entry.data)
+    data[CONF_CASH_USER_NAME] = domain[CONF_CASH_USER_NAME]
+    for key, option in _SHARED_OPTIONS:
+        value = domain.get(key)
+        if option in (CONF_DRINKS, CONF_ICONS):
+            if value and not data.get(option):
+                data[option] = value
+        elif value is not None and option not in data:
+            data[option] = value
+    for option in _ENTRY_OPTIONS:
+        if data.get(option) is None and domain.get(option) is not None:
+            data[option] = domain[option]
+    data.pop(CONF_USER_PIN, None)
+    return data
+
+
+async def _async_migrate_user_pin(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Move a PIN stored in the entry by old versions to the PIN store."""
+    user_name = entry.data.get(CONF_USER)
+    if user_name and entry.data.get(CONF_USER_PIN) is not None:
+        hass.data[DOMAIN][CONF_USER_PINS][user_name] = entry.data[CONF_USER_PIN]
+        await hass.data[DOMAIN]["pins_store"].async_save(
+            hass.data[DOMAIN][CONF_USER_PINS]
+        )
+
+
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Migrate an entry to the current version with a single write."""
+    if entry.version > TallyListConfigFlow.VERSION:
+        return False
+    if entry.version < 2:
+        # Merge the entry with the runtime state exactly as setup does, so the
+        # written data is final and setup finds nothing left to write.
+        _load_entry_options(hass, entry)
+        await _async_migrate_user_pin(hass, entry)
+        hass.config_entries.async_update_entry(
+            entry, data=_migrated_entry_data(hass, entry), version=2
+        )
+        _LOGGER.debug("Migrated entry %s to version 2", entry.entry_id)
+    return True
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up a config entry."""
     hass.data.setdefault(
@@ -705,13 +962,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             CONF_LOG_PIN_SET: True,
         },
     )
-    hass.data[DOMAIN].setdefault(entry.entry_id, {"entry": entry, "counts": {}, "credit": 0.0})
+    if entry.entry_id not in hass.data[DOMAIN]:
+        runtime = {"entry": entry, "counts": {}, "credit": 0.0}
+        load_entry(hass, runtime)
+        hass.data[DOMAIN][entry.entry_id] = runtime
+    register_user_entry(hass, hass.data[DOMAIN][entry.entry_id])
     cash_name = get_cash_user_name(hass.config.language)
-    hass.data[DOMAIN][CONF_CASH_USER_NAME] = cash_name
-    if entry.data.get(CONF_CASH_USER_NAME) != cash_name:
-        entry_data = dict(entry.data)
-        entry_data[CONF_CASH_USER_NAME] = cash_name
-        hass.config_entries.async_update_entry(entry, data=entry_data)
     if (
         cash_name
         and entry.data.get(CONF_USER, "").strip().lower() == cash_name.strip().lower()
@@ -719,193 +975,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         hass.data[DOMAIN]["free_drink_counts"] = hass.data[DOMAIN][entry.entry_id][
             "counts"
         ]
-    if not hass.data[DOMAIN].get("drinks") and entry.data.get("drinks"):
-        hass.data[DOMAIN]["drinks"] = entry.data["drinks"]
-    if not hass.data[DOMAIN].get("drink_icons") and entry.data.get(CONF_ICONS):
-        hass.data[DOMAIN]["drink_icons"] = entry.data[CONF_ICONS]
-    if hass.data[DOMAIN].get("drinks") and not entry.data.get("drinks"):
-        entry_data = {
-            "user": entry.data.get("user"),
-            CONF_FREE_AMOUNT: hass.data[DOMAIN].get("free_amount", 0.0),
-            CONF_EXCLUDED_USERS: hass.data[DOMAIN].get("excluded_users", []),
-            CONF_OVERRIDE_USERS: hass.data[DOMAIN].get("override_users", []),
-            CONF_CURRENCY: hass.data[DOMAIN].get(CONF_CURRENCY, "€"),
-        }
-        if "drinks" in hass.data[DOMAIN]:
-            entry_data["drinks"] = hass.data[DOMAIN]["drinks"]
-        if "drink_icons" in hass.data[DOMAIN]:
-            entry_data[CONF_ICONS] = hass.data[DOMAIN]["drink_icons"]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if hass.data[DOMAIN].get("drink_icons") and not entry.data.get(CONF_ICONS):
-        entry_data = dict(entry.data)
-        entry_data[CONF_ICONS] = hass.data[DOMAIN]["drink_icons"]
-        if "drinks" in hass.data[DOMAIN] and "drinks" not in entry_data:
-            entry_data["drinks"] = hass.data[DOMAIN]["drinks"]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if (
-        not hass.data[DOMAIN].get("free_amount")
-        and entry.data.get(CONF_FREE_AMOUNT) is not None
-    ):
-        hass.data[DOMAIN]["free_amount"] = entry.data[CONF_FREE_AMOUNT]
-    if (
-        hass.data[DOMAIN].get("free_amount") is not None
-        and CONF_FREE_AMOUNT not in entry.data
-    ):
-        entry_data = {
-            "user": entry.data.get("user"),
-            CONF_FREE_AMOUNT: hass.data[DOMAIN]["free_amount"],
-            CONF_EXCLUDED_USERS: hass.data[DOMAIN].get("excluded_users", []),
-            CONF_OVERRIDE_USERS: hass.data[DOMAIN].get("override_users", []),
-            CONF_CURRENCY: hass.data[DOMAIN].get(CONF_CURRENCY, "€"),
-        }
-        if "drinks" in hass.data[DOMAIN]:
-            entry_data["drinks"] = hass.data[DOMAIN]["drinks"]
-        if "drink_icons" in hass.data[DOMAIN]:
-            entry_data[CONF_ICONS] = hass.data[DOMAIN]["drink_icons"]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if (
-        not hass.data[DOMAIN].get("excluded_users")
-        and entry.data.get(CONF_EXCLUDED_USERS) is not None
-    ):
-        hass.data[DOMAIN]["excluded_users"] = entry.data[CONF_EXCLUDED_USERS]
-    if (
-        not hass.data[DOMAIN].get("override_users")
-        and entry.data.get(CONF_OVERRIDE_USERS) is not None
-    ):
-        hass.data[DOMAIN]["override_users"] = entry.data[CONF_OVERRIDE_USERS]
-    if (
-        hass.data[DOMAIN].get("excluded_users") is not None
-        and CONF_EXCLUDED_USERS not in entry.data
-    ):
-        entry_data = {
-            "user": entry.data.get("user"),
-            CONF_FREE_AMOUNT: hass.data[DOMAIN].get("free_amount", 0.0),
-            CONF_EXCLUDED_USERS: hass.data[DOMAIN]["excluded_users"],
-            CONF_OVERRIDE_USERS: hass.data[DOMAIN].get("override_users", []),
-            CONF_CURRENCY: hass.data[DOMAIN].get(CONF_CURRENCY, "€"),
-        }
-        if "drinks" in hass.data[DOMAIN]:
-            entry_data["drinks"] = hass.data[DOMAIN]["drinks"]
-        if "drink_icons" in hass.data[DOMAIN]:
-            entry_data[CONF_ICONS] = hass.data[DOMAIN]["drink_icons"]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if (
-        hass.data[DOMAIN].get("override_users") is not None
-        and CONF_OVERRIDE_USERS not in entry.data
-    ):
-        entry_data = {
-            "user": entry.data.get("user"),
-            CONF_FREE_AMOUNT: hass.data[DOMAIN].get("free_amount", 0.0),
-            CONF_EXCLUDED_USERS: hass.data[DOMAIN].get("excluded_users", []),
-            CONF_OVERRIDE_USERS: hass.data[DOMAIN]["override_users"],
-            CONF_CURRENCY: hass.data[DOMAIN].get(CONF_CURRENCY, "€"),
-        }
-        if "drinks" in hass.data[DOMAIN]:
-            entry_data["drinks"] = hass.data[DOMAIN]["drinks"]
-        if "drink_icons" in hass.data[DOMAIN]:
-            entry_data[CONF_ICONS] = hass.data[DOMAIN]["drink_icons"]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if (
-        not hass.data[DOMAIN].get(CONF_CURRENCY)
-        and entry.data.get(CONF_CURRENCY) is not None
-    ):
-        hass.data[DOMAIN][CONF_CURRENCY] = entry.data[CONF_CURRENCY]
-    if (
-        hass.data[DOMAIN].get(CONF_CURRENCY) is not None
-        and CONF_CURRENCY not in entry.data
-    ):
-        entry_data = {
-            "user": entry.data.get("user"),
-            CONF_FREE_AMOUNT: hass.data[DOMAIN].get("free_amount", 0.0),
-            CONF_EXCLUDED_USERS: hass.data[DOMAIN].get("excluded_users", []),
-            CONF_OVERRIDE_USERS: hass.data[DOMAIN].get("override_users", []),
-            CONF_CURRENCY: hass.data[DOMAIN][CONF_CURRENCY],
-            CONF_ENABLE_FREE_DRINKS: hass.data[DOMAIN].get(CONF_ENABLE_FREE_DRINKS, False),
-            CONF_CASH_USER_NAME: hass.data[DOMAIN].get(
-                CONF_CASH_USER_NAME, get_cash_user_name(hass.config.language)
-            ),
-        }
-        if "drinks" in hass.data[DOMAIN]:
-            entry_data["drinks"] = hass.data[DOMAIN]["drinks"]
-        if "drink_icons" in hass.data[DOMAIN]:
-            entry_data[CONF_ICONS] = hass.data[DOMAIN]["drink_icons"]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if (
-        not hass.data[DOMAIN].get(CONF_ENABLE_FREE_DRINKS)
-        and entry.data.get(CONF_ENABLE_FREE_DRINKS) is not None
-    ):
-        hass.data[DOMAIN][CONF_ENABLE_FREE_DRINKS] = entry.data[CONF_ENABLE_FREE_DRINKS]
-    if (
-        (hass.data[DOMAIN].get(CONF_ENABLE_FREE_DRINKS) is not None
-         and CONF_ENABLE_FREE_DRINKS not in entry.data)
-        or (
-            hass.data[DOMAIN].get(CONF_CASH_USER_NAME) is not None
-            and CONF_CASH_USER_NAME not in entry.data
-        )
-    ):
-        entry_data = {
-            "user": entry.data.get("user"),
-            CONF_FREE_AMOUNT: hass.data[DOMAIN].get("free_amount", 0.0),
-            CONF_EXCLUDED_USERS: hass.data[DOMAIN].get("excluded_users", []),
-            CONF_OVERRIDE_USERS: hass.data[DOMAIN].get("override_users", []),
-            CONF_CURRENCY: hass.data[DOMAIN].get(CONF_CURRENCY, "€"),
-            CONF_ENABLE_FREE_DRINKS: hass.data[DOMAIN].get(
-                CONF_ENABLE_FREE_DRINKS, False
-            ),
-            CONF_CASH_USER_NAME: hass.data[DOMAIN].get(
-                CONF_CASH_USER_NAME, get_cash_user_name(hass.config.language)
-            ),
-        }
-        if "drinks" in hass.data[DOMAIN]:
-            entry_data["drinks"] = hass.data[DOMAIN]["drinks"]
-        if "drink_icons" in hass.data[DOMAIN]:
-            entry_data[CONF_ICONS] = hass.data[DOMAIN]["drink_icons"]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if entry.data.get(CONF_PUBLIC_DEVICES) is not None:
-        hass.data[DOMAIN][CONF_PUBLIC_DEVICES] = entry.data[CONF_PUBLIC_DEVICES]
-    elif hass.data[DOMAIN].get(CONF_PUBLIC_DEVICES) is not None:
-        entry_data = dict(entry.data)
-        entry_data[CONF_PUBLIC_DEVICES] = hass.data[DOMAIN][CONF_PUBLIC_DEVICES]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if entry.data.get(CONF_ENABLE_LOGGING) is not None:
-        hass.data[DOMAIN][CONF_ENABLE_LOGGING] = entry.data[CONF_ENABLE_LOGGING]
-    elif hass.data[DOMAIN].get(CONF_ENABLE_LOGGING) is not None:
-        entry_data = dict(entry.data)
-        entry_data[CONF_ENABLE_LOGGING] = hass.data[DOMAIN][CONF_ENABLE_LOGGING]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if entry.data.get(CONF_LOG_DRINKS) is not None:
-        hass.data[DOMAIN][CONF_LOG_DRINKS] = entry.data[CONF_LOG_DRINKS]
-    elif hass.data[DOMAIN].get(CONF_LOG_DRINKS) is not None:
-        entry_data = dict(entry.data)
-        entry_data[CONF_LOG_DRINKS] = hass.data[DOMAIN][CONF_LOG_DRINKS]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if entry.data.get(CONF_LOG_PRICE_CHANGES) is not None:
-        hass.data[DOMAIN][CONF_LOG_PRICE_CHANGES] = entry.data[CONF_LOG_PRICE_CHANGES]
-    elif hass.data[DOMAIN].get(CONF_LOG_PRICE_CHANGES) is not None:
-        entry_data = dict(entry.data)
-        entry_data[CONF_LOG_PRICE_CHANGES] = hass.data[DOMAIN][CONF_LOG_PRICE_CHANGES]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if entry.data.get(CONF_LOG_FREE_DRINKS) is not None:
-        hass.data[DOMAIN][CONF_LOG_FREE_DRINKS] = entry.data[CONF_LOG_FREE_DRINKS]
-    elif hass.data[DOMAIN].get(CONF_LOG_FREE_DRINKS) is not None:
-        entry_data = dict(entry.data)
-        entry_data[CONF_LOG_FREE_DRINKS] = hass.data[DOMAIN][CONF_LOG_FREE_DRINKS]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    if entry.data.get(CONF_LOG_PIN_SET) is not None:
-        hass.data[DOMAIN][CONF_LOG_PIN_SET] = entry.data[CONF_LOG_PIN_SET]
-    elif hass.data[DOMAIN].get(CONF_LOG_PIN_SET) is not None:
-        entry_data = dict(entry.data)
-        entry_data[CONF_LOG_PIN_SET] = hass.data[DOMAIN][CONF_LOG_PIN_SET]
-        hass.config_entries.async_update_entry(entry, data=entry_data)
-    user_name = entry.data.get(CONF_USER)
-    if user_name and entry.data.get(CONF_USER_PIN) is not None:
-        pin = entry.data[CONF_USER_PIN]
-        hass.data[DOMAIN][CONF_USER_PINS][user_name] = pin
-        await hass.data[DOMAIN]["pins_store"].async_save(
-            hass.data[DOMAIN][CONF_USER_PINS]
-        )
-        entry_data = dict(entry.data)
-        entry_data.pop(CONF_USER_PIN, None)
+    _load_entry_options(hass, entry)
+    await _async_migrate_user_pin(hass, entry)
+    # Entries created by the flow may lack shared options, and the cash user
+    # name follows the language; write the result at most once.
+    entry_data = _migrated_entry_data(hass, entry)
+    if entry_data != entry.data:
         hass.config_entries.async_update_entry(entry, data=entry_data)
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     return True
@@ -918,20 +993,16 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     )
     if unloaded:
         if hass.data[DOMAIN].get("feed_entry_id") == entry.entry_id:
-            unsub = hass.data[DOMAIN].pop("feed_unsub", None)
-            if unsub is not None:
-                unsub()
             hass.data[DOMAIN].pop("free_drink_feed_sensor", None)
             hass.data[DOMAIN].pop("feed_add_entities", None)
             hass.data[DOMAIN].pop("feed_entry_id", None)
         if hass.data[DOMAIN].get("price_feed_entry_id") == entry.entry_id:
-            unsub = hass.data[DOMAIN].pop("price_feed_unsub", None)
-            if unsub is not None:
-                unsub()
             hass.data[DOMAIN].pop("price_list_feed_sensor", None)
             hass.data[DOMAIN].pop("price_feed_add_entities", None)
             hass.data[DOMAIN].pop("price_feed_entry_id", None)
-        hass.data[DOMAIN].pop(entry.entry_id, None)
+        data = hass.data[DOMAIN].pop(entry.entry_id, None)
+        if data is not None:
+            unregister_user_entry(hass, data)
         user_name = entry.data.get(CONF_USER)
         if user_name in PRICE_LIST_USERS:
             hass.data[DOMAIN].pop("drinks", None)
@@ -940,6 +1011,7 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             # Keep excluded users so they are not re-created when the price list
             # user is re-added later
             hass.data[DOMAIN].pop(CONF_OVERRIDE_USERS, None)
+            refresh_access_lists(hass)
             hass.data[DOMAIN].pop(CONF_CURRENCY, None)
             hass.data[DOMAIN].pop(CONF_ENABLE_FREE_DRINKS, None)
             hass.data[DOMAIN].pop(CONF_CASH_USER_NAME, None)
@@ -956,8 +1028,13 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Handle removal of a config entry."""
     user_name = entry.data.get(CONF_USER)
+    if user_name:
+        forget_user(hass, user_name)
+        discard_user_lock(hass, user_name)
     if user_name and CONF_USER_PINS in hass.data.get(DOMAIN, {}):
         hass.data[DOMAIN][CONF_USER_PINS].pop(user_name, None)
+        if "pin_cache" in hass.data[DOMAIN]:
+            hass.data[DOMAIN]["pin_cache"].invalidate(user_name)
         await hass.data[DOMAIN]["pins_store"].async_save(
             hass.data[DOMAIN][CONF_USER_PINS]
         )
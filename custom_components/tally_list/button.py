@@ -7,13 +7,12 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import Unauthorized
 
-from .utils import get_person_name, get_user_slug
+from .utils import get_user_permissions, get_user_slug
 
 from .const import (
     DOMAIN,
     SERVICE_RESET_COUNTERS,
     CONF_USER,
-    CONF_OVERRIDE_USERS,
     PRICE_LIST_USERS,
 )
 
@@ -44,15 +43,12 @@ class ResetButton(ButtonEntity):
     async def async_press(self) -> None:
         user_id = self._context.user_id if self._context else None
         if user_id is not None:
-            hass_user = await self._hass.auth.async_get_user(user_id)
-            if hass_user is not None:
-                override_users = self._hass.data.get(DOMAIN, {}).get(
-                    CONF_OVERRIDE_USERS,
-                    [],
-                )
-                person_name = get_person_name(self._hass, hass_user.id)
-                if person_name not in override_users:
+            permissions = get_user_permissions(self._hass, user_id)
+            if permissions is not None:
+                if not permissions["admin"]:
                     raise Unauthorized
+            elif await self._hass.auth.async_get_user(user_id) is not None:
+                raise Unauthorized
 
         await self._hass.services.async_call(
             DOMAIN,
@@ -4,7 +4,6 @@ from __future__ import annotations
 
 import logging
 import os
-import csv
 import re
 import voluptuous as vol
 
@@ -42,29 +41,46 @@ from .const import (
     get_cash_user_name,
 )
 
-from .utils import get_person_name
+from .utils import (
+    access_set,
+    get_person_name,
+    refresh_access_lists,
+    read_last_csv_row,
+    rewrite_csv_tail,
+    unregister_user_entry,
+)
+from .ledger import refresh_totals, reset_entry
+from .locks import async_lock_price_list
 from .sensor import PriceListFeedSensor
 
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def _log_time():
+    """Return the minute a log row belongs to."""
+    tz = dt_util.get_time_zone("Europe/Berlin")
+    return dt_util.now(tz).replace(second=0, microsecond=0)
+
+
 def _write_price_list_log(
-    hass, user: str, action: str, details: str
+    hass, user: str, action: str, details: str, ts=None
 ) -> None:
-    tz = dt_util.get_time_zone("Europe/Berlin")
-    ts = dt_util.now(tz).replace(second=0, microsecond=0)
+    if ts is None:
+        ts = _log_time()
     base_dir = hass.config.path("tally_list", "price_list")
     os.makedirs(base_dir, exist_ok=True)
     path = os.path.join(base_dir, f"price_list_{ts.year}.csv")
-    rows: list[list[str]] = []
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8", newline="") as csvfile:
-            rows = list(csv.reader(csvfile, delimiter=";"))
-    if not rows:
-        rows = [["Time", "User", "Action", "Details"]]
+    offset, last = read_last_csv_row(path) if os.path.exists(path) else (0, None)
+    rows: list[list[str]] = (
+        [last] if last is not None else [["Time", "User", "Action", "Details"]]
+    )
     key_time = ts.strftime("%Y-%m-%dT%H:%M")
-    if len(rows) > 1 and rows[-1][:3] == [key_time, user, action]:
+    if (
+        offset > 0
+        and len(rows[-1]) == 4
+        and rows[-1][:3] == [key_time, user, action]
+    ):
         existing = rows[-1][3]
         counts: dict[tuple[str, str, str], int] = {}
         order: list[tuple[str, str, str]] = []
@@ -104,9 +120,7 @@ def _write_price_list_log(
             rows[-1][3] = f"{existing},{details}"
     else:
         rows.append([key_time, user, action, details])
-    with open(path, "w", encoding="utf-8", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=";", quoting=csv.QUOTE_MINIMAL)
-        writer.writerows(rows)
+    rewrite_csv_tail(path, offset, rows)
 
 
 async def _async_update_price_feed_sensor(hass) -> None:
@@ -127,6 +141,27 @@ async def _async_update_price_feed_sensor(hass) -> None:
         add_entities([sensor])
 
 
+async def _async_write_price_list_log(
+    hass, user: str, action: str, details: str
+) -> None:
+    writer = hass.data.get(DOMAIN, {}).get("log_writer")
+    if writer is None:
+        await hass.async_add_executor_job(
+            _write_price_list_log, hass, user, action, details
+        )
+        await _async_update_price_feed_sensor(hass)
+        return
+    writer.queue(
+        _write_price_list_log,
+        hass,
+        user,
+        action,
+        details,
+        _log_time(),
+        refresh=_async_update_price_feed_sensor,
+    )
+
+
 async def _log_price_change(hass, user_id, action: str, details: str) -> None:
     if action in {"add_drink", "remove_drink"}:
         flag = CONF_LOG_DRINKS
@@ -167,10 +202,7 @@ async def _log_price_change(hass, user_id, action: str, details: str) -> None:
         )
         or "Unknown"
     )
-    await hass.async_add_executor_job(
-        _write_price_list_log, hass, name, action, details
-    )
-    await _async_update_price_feed_sensor(hass)
+    await _async_write_price_list_log(hass, name, action, details)
 
 async def _log_drink_list_change(hass, user_id, action: str, details: str) -> None:
     """Log modifications to the drink list separately from drink usage."""
@@ -201,9 +233,7 @@ async def _log_logging_toggle(hass, user_id, option: str, enabled: bool) -> None
         or "Unknown"
     )
     action = "enable_logging" if enabled else "disable_logging"
-    await hass.async_add_executor_job(
-        _write_price_list_log, hass, name, action, option
-    )
+    await _async_write_price_list_log(hass, name, action, option)
 
 
 def _get_flow_user_id(hass, context) -> str | None:
@@ -234,7 +264,7 @@ def _parse_drinks(value: str) -> dict[str, float]:
 class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow."""
 
-    VERSION = 1
+    VERSION = 2
 
     def __init__(self) -> None:
         self._user: str | None = None
@@ -326,7 +356,7 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
             existing = {entry.data.get(CONF_USER) for entry in entries}
 
-            excluded = set(self.hass.data.get(DOMAIN, {}).get(CONF_EXCLUDED_USERS, []))
+            excluded = access_set(self.hass, CONF_EXCLUDED_USERS)
 
             persons = [
                 p
@@ -387,7 +417,7 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
             existing = {entry.data.get(CONF_USER) for entry in entries}
 
-            excluded = set(self.hass.data.get(DOMAIN, {}).get(CONF_EXCLUDED_USERS, []))
+            excluded = access_set(self.hass, CONF_EXCLUDED_USERS)
             # Preserve already excluded users when the price list user is recreated
             self._excluded_users = list(excluded)
 
@@ -723,10 +753,11 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 and state.attributes.get("user_id")
             )
         ]
+        listed = frozenset(self._excluded_users)
         persons = [
             p
             for p in persons
-            if p not in self._excluded_users and p not in PRICE_LIST_USERS
+            if p not in listed and p not in PRICE_LIST_USERS
         ]
         if not persons:
             return await self.async_step_menu()
@@ -785,10 +816,11 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 and state.attributes.get("user_id")
             )
         ]
+        listed = frozenset(self._override_users)
         persons = [
             p
             for p in persons
-            if p not in self._override_users and p not in PRICE_LIST_USERS
+            if p not in listed and p not in PRICE_LIST_USERS
         ]
         if not persons:
             return await self.async_step_menu()
@@ -843,10 +875,11 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 and state.attributes.get("user_id")
             )
         ]
+        listed = frozenset(self._public_devices)
         persons = [
             p
             for p in persons
-            if p not in self._public_devices and p not in PRICE_LIST_USERS
+            if p not in listed and p not in PRICE_LIST_USERS
         ]
         if not persons:
             return await self.async_step_menu()
@@ -897,7 +930,8 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return await self.async_step_remove_public_user(user_input)
 
     async def async_step_finish(self, user_input=None):
-        await self._finalize_setup()
+        async with async_lock_price_list(self.hass):
+            await self._finalize_setup()
         return self.async_create_entry(
             title=self._user,
             data={
@@ -927,6 +961,7 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self.hass.data[DOMAIN][CONF_EXCLUDED_USERS] = self._excluded_users
         self.hass.data[DOMAIN][CONF_OVERRIDE_USERS] = self._override_users
         self.hass.data[DOMAIN][CONF_PUBLIC_DEVICES] = self._public_devices
+        refresh_access_lists(self.hass)
         self.hass.data[DOMAIN][CONF_CURRENCY] = self._currency
         self.hass.data[DOMAIN][CONF_ENABLE_FREE_DRINKS] = self._enable_free_drinks
         self.hass.data[DOMAIN][CONF_CASH_USER_NAME] = self._cash_user_name
@@ -936,6 +971,7 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self.hass.data[DOMAIN][CONF_LOG_FREE_DRINKS] = self._log_free_drinks
         self.hass.data[DOMAIN][CONF_LOG_PIN_SET] = self._log_pin_set
         self.hass.data[DOMAIN][CONF_LOG_SETTINGS] = self._log_settings
+        refresh_totals(self.hass)
         if self._create_price_user:
             await self.hass.config_entries.flow.async_init(
                 DOMAIN,
@@ -1030,7 +1066,7 @@ class TallyListConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         elif cash_entry is not None:
             cash_data = self.hass.data.get(DOMAIN, {}).get(cash_entry.entry_id)
             if cash_data is not None:
-                cash_data["counts"] = {}
+                reset_entry(self.hass, cash_data, ())
                 for sensor in cash_data.get("sensors", []):
                     await sensor.async_update_state()
             await self.hass.config_entries.async_remove(cash_entry.entry_id)
@@ -1349,7 +1385,8 @@ class TallyListOptionsFlowHandler(config_entries.OptionsFlow):
         )
 
     async def async_step_finish(self, user_input=None):
-        return await self._update_drinks()
+        async with async_lock_price_list(self.hass):
+            return await self._update_drinks()
 
     async def async_step_add_drink(self, user_input=None):
         if user_input is not None:
@@ -1484,10 +1521,11 @@ class TallyListOptionsFlowHandler(config_entries.OptionsFlow):
                 and state.attributes.get("user_id")
             )
         ]
+        listed = frozenset(self._excluded_users)
         persons = [
             p
             for p in persons
-            if p not in self._excluded_users and p not in PRICE_LIST_USERS
+            if p not in listed and p not in PRICE_LIST_USERS
         ]
 
         if not persons:
@@ -1553,10 +1591,11 @@ class TallyListOptionsFlowHandler(config_entries.OptionsFlow):
                 and state.attributes.get("user_id")
             )
         ]
+        listed = frozenset(self._override_users)
         persons = [
             p
             for p in persons
-            if p not in self._override_users and p not in PRICE_LIST_USERS
+            if p not in listed and p not in PRICE_LIST_USERS
         ]
 
         if not persons:
@@ -1622,10 +1661,11 @@ class TallyListOptionsFlowHandler(config_entries.OptionsFlow):
                 and state.attributes.get("user_id")
             )
         ]
+        listed = frozenset(self._public_devices)
         persons = [
             p
             for p in persons
-            if p not in self._public_devices and p not in PRICE_LIST_USERS
+            if p not in listed and p not in PRICE_LIST_USERS
         ]
         if not persons:
             return await self.async_step_menu()
@@ -1764,6 +1804,7 @@ class TallyListOptionsFlowHandler(config_entries.OptionsFlow):
         self.hass.data[DOMAIN][CONF_EXCLUDED_USERS] = self._excluded_users
         self.hass.data[DOMAIN][CONF_OVERRIDE_USERS] = self._override_users
         self.hass.data[DOMAIN][CONF_PUBLIC_DEVICES] = self._public_devices
+        refresh_access_lists(self.hass)
         self.hass.data[DOMAIN][CONF_CURRENCY] = self._currency
         self.hass.data[DOMAIN][CONF_CASH_USER_NAME] = self._cash_user_name
         self.hass.data[DOMAIN][CONF_ENABLE_LOGGING] = self._enable_logging
@@ -1806,7 +1847,7 @@ class TallyListOptionsFlowHandler(config_entries.OptionsFlow):
         elif cash_entry is not None:
             cash_data = self.hass.data.get(DOMAIN, {}).get(cash_entry.entry_id)
             if cash_data is not None:
-                cash_data["counts"] = {}
+                reset_entry(self.hass, cash_data, ())
                 for sensor in cash_data.get("sensors", []):
                     await sensor.async_update_state()
             self.hass.async_create_task(
@@ -1814,9 +1855,13 @@ class TallyListOptionsFlowHandler(config_entries.OptionsFlow):
             )
             self.hass.data[DOMAIN].pop("free_drink_counts", None)
             self.hass.data[DOMAIN].pop("free_drinks_ledger", None)
-            self.hass.data[DOMAIN].pop(cash_entry.entry_id, None)
+            cash_data = self.hass.data[DOMAIN].pop(cash_entry.entry_id, None)
+            if cash_data is not None:
+                unregister_user_entry(self.hass, cash_data)
             entries = [e for e in entries if e.entry_id != cash_entry.entry_id]
 
+        # Prices, free amount or cash user may have changed.
+        refresh_totals(self.hass)
         for entry in entries:
             data = {
                 CONF_USER: entry.data[CONF_USER],
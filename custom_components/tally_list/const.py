@@ -29,8 +29,10 @@ ATTR_FREE_DRINK = "free_drink"
 ATTR_COMMENT = "comment"
 ATTR_PIN = "pin"
 ATTR_AMOUNT = "amount"
+ATTR_ITEMS = "items"
 
 SERVICE_ADD_DRINK = "add_drink"
+SERVICE_ADD_DRINKS_BATCH = "add_drinks_batch"
 SERVICE_REMOVE_DRINK = "remove_drink"
 SERVICE_SET_DRINK = "set_drink"
 SERVICE_RESET_COUNTERS = "reset_counters"
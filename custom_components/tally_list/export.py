@@ -0,0 +1,279 @@
+"""CSV export of the Tally List ledger and logs.
+
+Exports are written as plain CSV, gzip-compressed CSV or newline-delimited
+JSON. The NDJSON layout starts with a header object naming the columns and
+the dictionary-encoded ones. Each new value of such a column appears once as
+``{"d": <column>, "v": <value>}``. Rows are JSON arrays that refer to those
+values by their order of appearance.
+"""
+
+from __future__ import annotations
+
+import calendar
+import csv
+import gzip
+import json
+import os
+import re
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, time, timedelta
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+else:  # pragma: no cover - used only for type hints
+    HomeAssistant = Any
+
+try:
+    from .const import DOMAIN, CONF_CURRENCY
+    from .ledger import ledger_snapshot
+except Exception:  # pragma: no cover - direct import for tests
+    from const import DOMAIN, CONF_CURRENCY
+    from ledger import ledger_snapshot
+
+
+def iter_export_rows(
+    snapshot: Iterable[tuple[str, dict, float, float]],
+    drinks: Iterable[str],
+    currency: str,
+) -> Iterator[list[str]]:
+    """Yield the CSV header followed by one row per user."""
+    drinks = list(drinks)
+    yield ["Name", f"Betrag ({currency})", *drinks, f"Guthaben ({currency})"]
+    for name, counts, credit, total in snapshot:
+        yield [
+            name,
+            f"{total:.2f}",
+            *(str(counts.get(drink, 0)) for drink in drinks),
+            f"{credit:.2f}",
+        ]
+
+
+EXPORT_FORMATS = {"csv": ".csv", "csv_gz": ".csv.gz", "ndjson": ".ndjson"}
+
+
+def iter_ndjson_lines(
+    rows: Iterable[list[str]], dictionary_columns: Iterable[int] = ()
+) -> Iterator[str]:
+    """Encode CSV rows as NDJSON with dictionary-encoded columns."""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = sorted(i for i in set(dictionary_columns) if i < len(header))
+    yield json.dumps(
+        {"columns": header, "dictionary": [header[i] for i in columns]},
+        ensure_ascii=False,
+    ) + "\n"
+    codes: dict[int, dict[str, int]] = {i: {} for i in columns}
+    for row in rows:
+        encoded: list[str | int] = list(row)
+        for i in columns:
+            if i >= len(row):
+                continue
+            code = codes[i].get(row[i])
+            if code is None:
+                code = codes[i][row[i]] = len(codes[i])
+                yield json.dumps({"d": i, "v": row[i]}, ensure_ascii=False) + "\n"
+            encoded[i] = code
+        yield json.dumps(encoded, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def write_export(
+    path: str,
+    rows: Iterable[list[str]],
+    fmt: str = "csv",
+    dictionary_columns: Iterable[int] = (),
+) -> None:
+    """Write ``rows`` to ``path`` in ``fmt`` one row at a time.
+
+    ``dictionary_columns`` only pays off for columns with few distinct
+    values; amount-due exports have one row per user and encode nothing.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "ndjson":
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(iter_ndjson_lines(rows, dictionary_columns))
+        return
+    opener = gzip.open if fmt == "csv_gz" else open
+    with opener(path, "wt", newline="", encoding="utf-8") as csvfile:
+        csv.writer(csvfile).writerows(rows)
+
+
+def export_rows(hass: HomeAssistant) -> Iterator[list[str]]:
+    """Return the export rows for the current ledger state."""
+    domain = hass.data.get(DOMAIN, {})
+    return iter_export_rows(
+        ledger_snapshot(hass),
+        list(domain.get("drinks", {})),
+        domain.get(CONF_CURRENCY, "€"),
+    )
+
+
+MANIFEST_NAME = ".manifest.json"
+
+_BACKUP_NAME_RE = re.compile(
+    r"^amount_due_(?P<kind>daily|weekly|monthly|manual)_(?P<stamp>[0-9_-]+)\."
+)
+
+
+def backup_period_start(filename: str) -> datetime | None:
+    """Return the start of the period a backup file covers, from its name."""
+    match = _BACKUP_NAME_RE.match(filename)
+    if match is None:
+        return None
+    kind, stamp = match.group("kind"), match.group("stamp")
+    try:
+        if kind == "weekly":
+            year, week = stamp.split("-")
+            return datetime.combine(
+                date.fromisocalendar(int(year), int(week), 1), time()
+            )
+        if kind == "monthly":
+            return datetime.strptime(stamp, "%Y-%m")
+        return datetime.strptime(stamp, "%Y-%m-%d_%H-%M")
+    except ValueError:
+        return None
+
+
+def _subtract_months(moment: datetime, months: int) -> datetime:
+    year, month = divmod(moment.year * 12 + moment.month - 1 - months, 12)
+    day = min(moment.day, calendar.monthrange(year, month + 1)[1])
+    return moment.replace(year=year, month=month + 1, day=day)
+
+
+def retention_cutoff(now: datetime, keep: int, unit: str) -> datetime:
+    """Return the start of the oldest period that is still kept."""
+    today = datetime.combine(now.date(), time())
+    if unit == "weeks":
+        monday = today - timedelta(days=today.weekday())
+        return monday - timedelta(weeks=keep)
+    if unit == "months":
+        return _subtract_months(today.replace(day=1), keep)
+    return today - timedelta(days=keep)
+
+
+def _load_manifest(directory: str) -> list[dict]:
+    path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as file:
+            entries = json.load(file)
+        if isinstance(entries, list):
+            return entries
+    except (OSError, ValueError):
+        pass
+    # Missing or unreadable manifest: index existing backups once.
+    entries = []
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            start = backup_period_start(filename)
+            if start is not None:
+                entries.append(
+                    {"file": filename, "period": start.isoformat(), "created": None}
+                )
+    entries.sort(key=lambda entry: entry["period"])
+    return entries
+
+
+def _save_manifest(directory: str, entries: list[dict]) -> None:
+    path = os.path.join(directory, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(entries, file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def record_backup(path: str, created: datetime) -> None:
+    """Add a written backup file to the manifest of its directory."""
+    directory, filename = os.path.split(path)
+    start = backup_period_start(filename)
+    if start is None:
+        return
+    entries = [
+        entry for entry in _load_manifest(directory) if entry["file"] != filename
+    ]
+    entries.append(
+        {
+            "file": filename,
+            "period": start.isoformat(),
+            "created": created.isoformat(),
+        }
+    )
+    entries.sort(key=lambda entry: entry["period"])
+    _save_manifest(directory, entries)
+
+
+def write_backup(
+    path: str, rows: Iterable[list[str]], created: datetime, fmt: str = "csv"
+) -> None:
+    """Write an export file and record it in the backup manifest."""
+    write_export(path, rows, fmt)
+    record_backup(path, created)
+
+
+# Dictionary-encoded columns of the yearly logs: the user and the drinks of
+# the free drink log, the user and the action of the price list log.
+_LOG_DICTIONARY_COLUMNS = {"free_drinks": (1, 2), "price_list": (1, 2)}
+
+
+def _iter_log_rows(path: str) -> Iterator[list[str]]:
+    with open(path, newline="", encoding="utf-8") as file:
+        yield from csv.reader(file, delimiter=";")
+
+
+def export_logs(base_dir: str, dest_dir: str, fmt: str) -> list[str]:
+    """Convert the yearly CSV logs under ``base_dir`` to ``fmt``.
+
+    Files are streamed row by row. Logs whose export is newer than the
+    source are skipped, so only the current year is usually rewritten.
+    Returns the names of the written files.
+    """
+    written: list[str] = []
+    for kind, dictionary_columns in _LOG_DICTIONARY_COLUMNS.items():
+        source_dir = os.path.join(base_dir, kind)
+        if not os.path.isdir(source_dir):
+            continue
+        for filename in sorted(os.listdir(source_dir)):
+            if not re.fullmatch(rf"{kind}_\d{{4}}\.csv", filename):
+                continue
+            source = os.path.join(source_dir, filename)
+            dest = os.path.join(
+                dest_dir, filename[: -len(".csv")] + EXPORT_FORMATS[fmt]
+            )
+            if os.path.exists(dest) and os.path.getmtime(dest) >= os.path.getmtime(
+                source
+            ):
+                continue
+            write_export(dest, _iter_log_rows(source), fmt, dictionary_columns)
+            written.append(os.path.basename(dest))
+    return written
+
+
+def cleanup_backups(
+    directory: str, keep: int | None, unit: str, now: datetime
+) -> list[str]:
+    """Delete backups outside the retention window and return their names.
+
+    ``unit`` is ``files`` to keep the newest ``keep`` backups, otherwise
+    ``days``, ``weeks`` or ``months``. Periods come from the file names and
+    the manifest is sorted by period, so only expired entries are touched.
+    """
+    if keep is None or keep <= 0 or not os.path.isdir(directory):
+        return []
+    entries = _load_manifest(directory)
+    if unit == "files":
+        expired = max(len(entries) - keep, 0)
+    else:
+        cutoff = retention_cutoff(now.replace(tzinfo=None), keep, unit).isoformat()
+        expired = 0
+        while expired < len(entries) and entries[expired]["period"] < cutoff:
+            expired += 1
+    removed = [entry["file"] for entry in entries[:expired]]
+    for filename in removed:
+        try:
+            os.remove(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
+    if removed or not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        _save_manifest(directory, entries[expired:])
+    return removed
@@ -0,0 +1,144 @@
+"""Write-ahead journal for the Tally List ledger.
+
+Every ledger change appends the user's full record (counts and credit) with
+a sequence number to a JSON lines file. Appends are batched into a single
+executor job with one ``fsync``. The ``Store`` snapshot remembers the last
+sequence number it contains, so on startup only newer journal records are
+replayed. Once the journal grows past a threshold, a snapshot is written
+and the journal truncated.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections.abc import Callable
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+else:  # pragma: no cover - used only for type hints
+    HomeAssistant = Any
+
+_LOGGER = logging.getLogger(__name__)
+
+JOURNAL_COMPACT_THRESHOLD = 500
+
+
+class LedgerJournal:
+    """Append-only journal of ledger records with batched fsync."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        path: str,
+        store,
+        data_func: Callable[[], dict],
+        compact_threshold: int = JOURNAL_COMPACT_THRESHOLD,
+    ) -> None:
+        self._hass = hass
+        self._path = path
+        self._store = store
+        self._data_func = data_func
+        self._compact_threshold = compact_threshold
+        self._pending: list[str] = []
+        self._task = None
+        self._lines = 0
+        self.seq = 0
+
+    def _read(self) -> list[dict]:
+        records: list[dict] = []
+        try:
+            with open(self._path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A torn write from a power cut; later records are
+                        # still usable because every record is absolute.
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _append(self, lines: list[str]) -> None:
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, "a", encoding="utf-8") as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _truncate(self) -> None:
+        with open(self._path, "w", encoding="utf-8") as file:
+            file.flush()
+            os.fsync(file.fileno())
+
+    async def async_replay(self, users: dict, snapshot_seq: int) -> int:
+        """Apply journal records newer than ``snapshot_seq`` to ``users``.
+
+        Returns the number of replayed records. Afterwards the merged state
+        is saved as a new snapshot and the journal is cleared, so a torn last
+        line never gets new records appended to it.
+        """
+        records = await self._hass.async_add_executor_job(self._read)
+        self.seq = snapshot_seq
+        replayed = 0
+        for record in records:
+            seq = record.get("seq", 0)
+            user = record.get("user")
+            if seq <= snapshot_seq or not user:
+                continue
+            if record.get("removed"):
+                users.pop(user, None)
+            else:
+                users[user] = {
+                    "counts": record.get("counts", {}),
+                    "credit": record.get("credit", 0.0),
+                }
+            self.seq = max(self.seq, seq)
+            replayed += 1
+        if records:
+            if replayed:
+                _LOGGER.info("Replayed %s ledger journal records", replayed)
+            await self._store.async_save(self._data_func())
+            await self._hass.async_add_executor_job(self._truncate)
+        return replayed
+
+    def record(self, user: str, record: dict | None) -> None:
+        """Queue a user's record, or its removal when ``record`` is None."""
+        self.seq += 1
+        entry: dict[str, Any] = {"seq": self.seq, "user": user}
+        if record is None:
+            entry["removed"] = True
+        else:
+            entry.update(record)
+        self._pending.append(json.dumps(entry, ensure_ascii=False) + "\n")
+        if self._task is None:
+            self._task = self._hass.async_create_task(self._async_write())
+
+    async def _async_write(self) -> None:
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    await self._hass.async_add_executor_job(self._append, batch)
+                except OSError as err:
+                    _LOGGER.error("Failed to write ledger journal: %s", err)
+                    return
+                self._lines += len(batch)
+            if self._lines >= self._compact_threshold:
+                # Every line on disk is covered by the snapshot; records
+                # queued meanwhile are written after the truncation.
+                await self._store.async_save(self._data_func())
+                await self._hass.async_add_executor_job(self._truncate)
+                self._lines = 0
+        finally:
+            self._task = None
+        if self._pending:
+            self._task = self._hass.async_create_task(self._async_write())
+
+    async def async_flush(self) -> None:
+        """Wait until all queued records are on disk."""
+        while self._task is not None:
+            await self._task
@@ -0,0 +1,312 @@
+"""Running totals for the per-user ledger of Tally List.
+
+Counts and credit live in the per-entry dict in ``hass.data[DOMAIN]``. The
+helpers below mutate them and keep the gross value of all counts and the
+resulting amount due up to date, so reading the total is a dict lookup.
+Totals are computed lazily the first time they are needed.
+
+Counts and credit are persisted in one ``Store`` document keyed by user name,
+written with a delayed save so bursts of bookings result in a single write.
+Each change is also appended to the write-ahead journal so bookings made
+since the last snapshot survive a power cut.
+
+Listeners registered with ``async_subscribe`` receive the changes of one
+event loop iteration as a single payload.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+else:  # pragma: no cover - used only for type hints
+    HomeAssistant = Any
+
+try:
+    from .const import DOMAIN, CONF_CASH_USER_NAME, CONF_USER, PRICE_LIST_USERS
+    from .utils import SNAPSHOT_CACHE_KEY, user_entries
+except Exception:  # pragma: no cover - direct import for tests
+    from const import DOMAIN, CONF_CASH_USER_NAME, CONF_USER, PRICE_LIST_USERS
+    from utils import SNAPSHOT_CACHE_KEY, user_entries
+
+LEDGER_STORAGE_VERSION = 1
+LEDGER_STORAGE_KEY = f"{DOMAIN}_ledger"
+LEDGER_SAVE_DELAY = 10
+
+
+def _entry_user(data: dict) -> str:
+    entry = data.get("entry")
+    return entry.data.get(CONF_USER, "") if entry is not None else ""
+
+
+def ledger_document(hass: HomeAssistant) -> dict:
+    """Return the ledger snapshot written to the store."""
+    domain = hass.data.get(DOMAIN, {})
+    journal = domain.get("ledger_journal")
+    return {
+        "seq": journal.seq if journal is not None else 0,
+        "users": dict(domain.get("ledger_users", {})),
+    }
+
+
+def ledger_snapshot(hass: HomeAssistant) -> list[tuple[str, dict, float, float]]:
+    """Return ``(name, counts, credit, amount_due)`` for every tally user.
+
+    The counts are copied, so the result can be handed to executor jobs or
+    sent to clients while bookings keep changing the ledger.
+    """
+    rows = []
+    for data in user_entries(hass):
+        name = _entry_user(data)
+        if name in PRICE_LIST_USERS:
+            continue
+        rows.append(
+            (
+                name,
+                dict(data.get("counts", {})),
+                data.get("credit", 0.0),
+                amount_due(hass, data, name),
+            )
+        )
+    rows.sort(key=lambda row: row[0].casefold())
+    return rows
+
+
+def snapshot_payload(hass: HomeAssistant) -> dict:
+    """Return the full ledger as sent to subscribers."""
+    return {
+        "drinks": dict(hass.data.get(DOMAIN, {}).get("drinks", {})),
+        "users": [
+            {"user": name, "counts": counts, "credit": credit, "total": total}
+            for name, counts, credit, total in ledger_snapshot(hass)
+        ],
+    }
+
+
+def snapshot_matrix(hass: HomeAssistant) -> dict:
+    """Return all counts as a users × drinks matrix.
+
+    The result is cached until the ledger changes, so repeated requests from
+    dashboards are served without touching the entries. Callers must not
+    modify it.
+    """
+    domain = hass.data.get(DOMAIN, {})
+    cached = domain.get(SNAPSHOT_CACHE_KEY)
+    if cached is not None:
+        return cached
+    prices = domain.get("drinks", {})
+    drinks = list(prices)
+    rows = ledger_snapshot(hass)
+    matrix = {
+        "drinks": drinks,
+        "prices": [prices[drink] for drink in drinks],
+        "users": [name for name, _, _, _ in rows],
+        "counts": [
+            [counts.get(drink, 0) for drink in drinks] for _, counts, _, _ in rows
+        ],
+        "credits": [credit for _, _, credit, _ in rows],
+        "totals": [total for _, _, _, total in rows],
+    }
+    if DOMAIN in hass.data:
+        domain[SNAPSHOT_CACHE_KEY] = matrix
+    return matrix
+
+
+def async_subscribe(
+    hass: HomeAssistant, listener: Callable[[dict], None]
+) -> Callable[[], None]:
+    """Call ``listener`` with ``changes`` or ``snapshot`` payloads.
+
+    Returns a function that removes the listener again.
+    """
+    listeners = hass.data[DOMAIN].setdefault("ledger_listeners", [])
+    listeners.append(listener)
+
+    def _remove() -> None:
+        if listener in listeners:
+            listeners.remove(listener)
+
+    return _remove
+
+
+def _notify(hass: HomeAssistant, data: dict, counts: dict | None = None) -> None:
+    domain = hass.data.get(DOMAIN, {})
+    domain.pop(SNAPSHOT_CACHE_KEY, None)
+    if not domain.get("ledger_listeners"):
+        return
+    user = _entry_user(data)
+    if not user or user in PRICE_LIST_USERS:
+        return
+    pending = domain.setdefault("ledger_pending_changes", {})
+    if not pending:
+        hass.loop.call_soon(_flush_changes, hass)
+    _, changed = pending.setdefault(user, (data, {}))
+    if counts:
+        changed.update(counts)
+
+
+def _flush_changes(hass: HomeAssistant) -> None:
+    domain = hass.data.get(DOMAIN, {})
+    pending = domain.pop("ledger_pending_changes", {})
+    if not pending:
+        return
+    changes = [
+        {
+            "user": user,
+            "counts": changed,
+            "credit": data.get("credit", 0.0),
+            "total": amount_due(hass, data, user),
+        }
+        for user, (data, changed) in pending.items()
+    ]
+    for listener in list(domain.get("ledger_listeners", [])):
+        listener({"changes": changes})
+
+
+def _persist(hass: HomeAssistant, data: dict) -> None:
+    domain = hass.data.get(DOMAIN, {})
+    store = domain.get("ledger_store")
+    user = _entry_user(data)
+    if store is None or not user:
+        return
+    record = {
+        "counts": dict(data.get("counts", {})),
+        "credit": data.get("credit", 0.0),
+    }
+    domain.setdefault("ledger_users", {})[user] = record
+    journal = domain.get("ledger_journal")
+    if journal is not None:
+        journal.record(user, record)
+    store.async_delay_save(lambda: ledger_document(hass), LEDGER_SAVE_DELAY)
+
+
+def load_entry(hass: HomeAssistant, data: dict) -> bool:
+    """Seed counts and credit of a new entry from the stored ledger.
+
+    Returns ``True`` and marks the entry as ``stored`` when the user has a
+    record, so sensors skip their restore-state fallback.
+    """
+    users = hass.data.get(DOMAIN, {}).get("ledger_users", {})
+    record = users.get(_entry_user(data))
+    if record is None:
+        return False
+    data["counts"] = {
+        drink: int(count) for drink, count in record.get("counts", {}).items()
+    }
+    data["credit"] = float(record.get("credit", 0.0))
+    data["stored"] = True
+    hass.data[DOMAIN].pop(SNAPSHOT_CACHE_KEY, None)
+    for key in ("gross", "is_cash", "amount_due"):
+        data.pop(key, None)
+    return True
+
+
+def forget_user(hass: HomeAssistant, user: str) -> None:
+    """Drop the stored record of a removed user."""
+    domain = hass.data.get(DOMAIN, {})
+    store = domain.get("ledger_store")
+    users = domain.get("ledger_users", {})
+    if store is None or users.pop(user, None) is None:
+        return
+    journal = domain.get("ledger_journal")
+    if journal is not None:
+        journal.record(user, None)
+    store.async_delay_save(lambda: ledger_document(hass), LEDGER_SAVE_DELAY)
+
+
+def _update_amount_due(hass: HomeAssistant, data: dict) -> None:
+    total = data["gross"]
+    if not data["is_cash"]:
+        free_amount = hass.data.get(DOMAIN, {}).get("free_amount", 0.0)
+        total = max(total - free_amount, 0.0)
+    data["amount_due"] = round(total - data.get("credit", 0.0), 2)
+
+
+def _recompute(
+    hass: HomeAssistant,
+    data: dict,
+    prices: dict[str, float],
+    cash_name: str,
+    user: str | None = None,
+) -> None:
+    counts = data.setdefault("counts", {})
+    data["gross"] = sum(counts.get(drink, 0) * price for drink, price in prices.items())
+    if user is None:
+        user = _entry_user(data)
+    data["is_cash"] = user.strip().lower() == cash_name
+    _update_amount_due(hass, data)
+
+
+def amount_due(hass: HomeAssistant, data: dict, user: str | None = None) -> float:
+    """Return the amount due of an entry, computing it on first access."""
+    if "amount_due" not in data:
+        domain = hass.data.get(DOMAIN, {})
+        _recompute(
+            hass,
+            data,
+            domain.get("drinks", {}),
+            domain.get(CONF_CASH_USER_NAME, "").strip().lower(),
+            user,
+        )
+    return data["amount_due"]
+
+
+def set_count(hass: HomeAssistant, data: dict, drink: str, value: int) -> int:
+    """Set the count of ``drink`` and adjust the running totals."""
+    counts = data.setdefault("counts", {})
+    old = counts.get(drink, 0)
+    counts[drink] = value
+    if "gross" in data:
+        price = hass.data.get(DOMAIN, {}).get("drinks", {}).get(drink, 0.0)
+        data["gross"] += (value - old) * price
+        _update_amount_due(hass, data)
+    _persist(hass, data)
+    _notify(hass, data, {drink: value})
+    return value
+
+
+def add_count(hass: HomeAssistant, data: dict, drink: str, delta: int) -> int:
+    """Add ``delta`` to the count of ``drink`` and adjust the running totals."""
+    counts = data.setdefault("counts", {})
+    return set_count(hass, data, drink, counts.get(drink, 0) + delta)
+
+
+def set_credit(hass: HomeAssistant, data: dict, value: float) -> float:
+    """Set the credit of an entry and adjust its amount due."""
+    data["credit"] = value
+    if "gross" in data:
+        _update_amount_due(hass, data)
+    _persist(hass, data)
+    _notify(hass, data)
+    return value
+
+
+def reset_entry(hass: HomeAssistant, data: dict, drinks) -> None:
+    """Zero all counts and the credit of an entry."""
+    data["counts"] = {drink: 0 for drink in drinks}
+    data["credit"] = 0.0
+    data["gross"] = 0.0
+    data["is_cash"] = (
+        _entry_user(data).strip().lower()
+        == hass.data.get(DOMAIN, {}).get(CONF_CASH_USER_NAME, "").strip().lower()
+    )
+    _update_amount_due(hass, data)
+    _persist(hass, data)
+    _notify(hass, data, data["counts"])
+
+
+def refresh_totals(hass: HomeAssistant) -> None:
+    """Recompute all totals after prices, the free amount or the cash user changed."""
+    domain = hass.data.get(DOMAIN, {})
+    prices = domain.get("drinks", {})
+    cash_name = domain.get(CONF_CASH_USER_NAME, "").strip().lower()
+    for data in user_entries(hass):
+        _recompute(hass, data, prices, cash_name)
+    domain.pop(SNAPSHOT_CACHE_KEY, None)
+    listeners = domain.get("ledger_listeners")
+    if listeners:
+        payload = {"snapshot": snapshot_payload(hass)}
+        for listener in list(listeners):
+            listener(payload)
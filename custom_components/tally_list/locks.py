@@ -0,0 +1,91 @@
+"""Locks that linearize ledger operations of Tally List.
+
+Service handlers hold the lock of every user they touch from the first
+ledger change until the change is logged, so two tablets booking for the
+same user cannot interleave with a removal or reset. Bookings for
+different users run in parallel. Locks of several users are always taken
+in sorted order to avoid deadlocks. Changes to the price list affect every
+user; they take a global lock and then the locks of all users, so no
+booking runs against a half-applied price list.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+else:  # pragma: no cover - used only for type hints
+    HomeAssistant = Any
+
+try:
+    from .const import DOMAIN, CONF_USER
+    from .utils import user_entries
+except Exception:  # pragma: no cover - direct import for tests
+    from const import DOMAIN, CONF_USER
+    from utils import user_entries
+
+USER_LOCKS_KEY = "user_locks"
+PRICE_LOCK_KEY = "price_lock"
+
+
+def user_lock(hass: HomeAssistant, user: str) -> asyncio.Lock:
+    """Return the lock guarding the ledger of ``user``."""
+    locks = hass.data.setdefault(DOMAIN, {}).setdefault(USER_LOCKS_KEY, {})
+    lock = locks.get(user)
+    if lock is None:
+        lock = locks[user] = asyncio.Lock()
+    return lock
+
+
+def price_lock(hass: HomeAssistant) -> asyncio.Lock:
+    """Return the lock guarding changes to the price list."""
+    domain = hass.data.setdefault(DOMAIN, {})
+    lock = domain.get(PRICE_LOCK_KEY)
+    if lock is None:
+        lock = domain[PRICE_LOCK_KEY] = asyncio.Lock()
+    return lock
+
+
+@asynccontextmanager
+async def async_lock_users(
+    hass: HomeAssistant, users: Iterable[str]
+) -> AsyncIterator[None]:
+    """Hold the locks of all ``users`` for the duration of the block."""
+    held: list[asyncio.Lock] = []
+    try:
+        for user in sorted(set(users)):
+            lock = user_lock(hass, user)
+            await lock.acquire()
+            held.append(lock)
+        yield
+    finally:
+        for lock in reversed(held):
+            lock.release()
+
+
+def all_users(hass: HomeAssistant) -> set[str]:
+    """Return the names of all registered users."""
+    return {data["entry"].data.get(CONF_USER, "") for data in user_entries(hass)}
+
+
+@asynccontextmanager
+async def async_lock_price_list(hass: HomeAssistant) -> AsyncIterator[None]:
+    """Hold the price list lock and the locks of all users.
+
+    Bookings wait until the new prices are applied everywhere.
+    """
+    async with price_lock(hass):
+        async with async_lock_users(hass, all_users(hass)):
+            yield
+
+
+def discard_user_lock(hass: HomeAssistant, user: str) -> None:
+    """Drop the lock of a removed user unless an operation still holds it."""
+    locks = hass.data.get(DOMAIN, {}).get(USER_LOCKS_KEY, {})
+    lock = locks.get(user)
+    if lock is not None and not lock.locked():
+        del locks[user]
@@ -0,0 +1,104 @@
+"""Buffered writer for the Tally List CSV logs.
+
+Log rows from all services are queued in memory and written by a single
+background task. A batch is flushed after a short delay or once enough rows
+are pending, and every batch runs as one executor job, so two bookings never
+read and rewrite the same log file at the same time. Rows keep the time
+they were queued, not the time they reach the disk.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+else:  # pragma: no cover - used only for type hints
+    HomeAssistant = Any
+
+_LOGGER = logging.getLogger(__name__)
+
+LOG_FLUSH_DELAY = 1.0
+LOG_FLUSH_THRESHOLD = 50
+
+
+class LogWriter:
+    """Queue log rows and write them in batches from one task."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        delay: float = LOG_FLUSH_DELAY,
+        threshold: int = LOG_FLUSH_THRESHOLD,
+    ) -> None:
+        self._hass = hass
+        self._delay = delay
+        self._threshold = threshold
+        self._pending: list[tuple[Callable[..., None], tuple]] = []
+        self._refresh: dict[
+            Callable[[HomeAssistant], Awaitable[None]], None
+        ] = {}
+        self._timer = None
+        self._task = None
+
+    def queue(
+        self,
+        func: Callable[..., None],
+        *args: Any,
+        refresh: Callable[[HomeAssistant], Awaitable[None]] | None = None,
+    ) -> None:
+        """Queue ``func(*args)``.
+
+        ``refresh`` is awaited with ``hass`` once the batch containing the
+        row is written; each callback runs once per batch.
+        """
+        self._pending.append((func, args))
+        if refresh is not None:
+            self._refresh[refresh] = None
+        if len(self._pending) >= self._threshold:
+            self._start()
+        elif self._timer is None and self._task is None:
+            self._timer = self._hass.loop.call_later(self._delay, self._start)
+
+    def _start(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._task is None and self._pending:
+            self._task = self._hass.async_create_task(self._async_write())
+
+    @staticmethod
+    def _write(batch: list[tuple[Callable[..., None], tuple]]) -> None:
+        for func, args in batch:
+            # One broken row, e.g. a hand-edited log, must not drop the
+            # rows queued after it.
+            try:
+                func(*args)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception(
+                    "Failed to write log row via %s", func.__name__
+                )
+
+    async def _async_write(self) -> None:
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                refresh, self._refresh = list(self._refresh), {}
+                try:
+                    await self._hass.async_add_executor_job(self._write, batch)
+                finally:
+                    for func in refresh:
+                        try:
+                            await func(self._hass)
+                        except Exception:  # pylint: disable=broad-except
+                            _LOGGER.exception("Failed to refresh log feed")
+        finally:
+            self._task = None
+
+    async def async_flush(self) -> None:
+        """Write all queued rows now and wait until they are on disk."""
+        self._start()
+        while self._task is not None:
+            await self._task
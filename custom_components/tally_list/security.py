@@ -3,9 +3,19 @@ from __future__ import annotations
 import hashlib
 import hmac
 import os
+import time
+from collections import OrderedDict
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+else:  # pragma: no cover - used only for type hints
+    HomeAssistant = Any
 
 PBKDF2_ALGORITHM = "pbkdf2_sha256"
 PBKDF2_ITERATIONS = 100_000
+PIN_CACHE_TTL = 120
+PIN_CACHE_SIZE = 256
 
 
 def hash_pin(pin: str) -> str:
@@ -44,3 +54,93 @@ def verify_pin(pin: str, stored: str) -> bool:
 
     key = hashlib.pbkdf2_hmac("sha256", pin.encode(), salt, iterations)
     return hmac.compare_digest(key.hex(), hashed)
+
+
+async def async_hash_pin(hass: HomeAssistant, pin: str) -> str:
+    """Hash a PIN in the executor so the event loop is not blocked."""
+    return await hass.async_add_executor_job(hash_pin, pin)
+
+
+async def async_verify_pin(hass: HomeAssistant, pin: str, stored: str) -> bool:
+    """Verify a PIN in the executor so the event loop is not blocked.
+
+    Key derivation takes tens of milliseconds on small devices; running it
+    in a worker thread keeps Home Assistant responsive while public devices
+    book drinks.
+    """
+    return await hass.async_add_executor_job(verify_pin, pin, stored)
+
+
+class PinVerificationCache:
+    """Remember successful PIN verifications for a short time.
+
+    Entries are keyed by the device user, the target user and a keyed digest
+    of the PIN and its stored hash, so plaintext PINs are never kept and a
+    changed PIN never matches an old entry. The cache is bounded in size and
+    evicts the least recently used entry first.
+    """
+
+    def __init__(
+        self, ttl: float = PIN_CACHE_TTL, max_size: int = PIN_CACHE_SIZE
+    ) -> None:
+        self._ttl = ttl
+        self._max_size = max_size
+        self._secret = os.urandom(32)
+        self._entries: OrderedDict[tuple[str, str, bytes], float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(
+        self, device_user: str, target_user: str, pin: str, stored: str
+    ) -> tuple[str, str, bytes]:
+        digest = hmac.new(
+            self._secret, f"{pin}\0{stored}".encode(), hashlib.sha256
+        ).digest()
+        return device_user, target_user, digest
+
+    def contains(
+        self, device_user: str, target_user: str, pin: str, stored: str
+    ) -> bool:
+        """Return whether a still valid verification is cached."""
+        key = self._key(device_user, target_user, pin, stored)
+        expires = self._entries.get(key)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._entries[key]
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def add(self, device_user: str, target_user: str, pin: str, stored: str) -> None:
+        """Cache a successful verification."""
+        key = self._key(device_user, target_user, pin, stored)
+        self._entries[key] = time.monotonic() + self._ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, target_user: str | None = None) -> None:
+        """Drop cached verifications for ``target_user`` or all users."""
+        if target_user is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[1] == target_user]:
+            del self._entries[key]
+
+    async def async_verify(
+        self,
+        hass: HomeAssistant,
+        device_user: str,
+        target_user: str,
+        pin: str,
+        stored: str,
+    ) -> bool:
+        """Verify a PIN, skipping the key derivation for cached successes."""
+        if self.contains(device_user, target_user, pin, stored):
+            return True
+        if not await async_verify_pin(hass, pin, stored):
+            return False
+        self.add(device_user, target_user, pin, stored)
+        return True
@@ -2,21 +2,20 @@
 
 from __future__ import annotations
 
-import csv
 import logging
 import os
 import re
-from collections import deque
-from datetime import datetime, timedelta
+from collections.abc import Callable
+from datetime import datetime
 
 from homeassistant.components.sensor import SensorEntity
-from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.util import slugify
 
-from .utils import get_user_slug
+from .ledger import amount_due, set_count, set_credit
+from .utils import get_user_slug, iter_csv_rows_reversed
 
 from .const import (
     DOMAIN,
@@ -28,6 +27,8 @@ from .const import (
 
 _LOGGER = logging.getLogger(__name__)
 
+PENDING_WRITES_KEY = "pending_sensor_writes"
+
 
 def _local_suffix(hass: HomeAssistant, en: str, de: str) -> str:
     """Return language-specific sensor name suffix."""
@@ -75,15 +76,6 @@ async def async_setup_entry(
         data.setdefault("sensors", []).append(feed_sensor)
         hass.data[DOMAIN]["free_drink_feed_sensor"] = feed_sensor
 
-        async def _periodic_update(_now):
-            sensor = hass.data[DOMAIN].get("free_drink_feed_sensor")
-            if sensor is not None:
-                await sensor.async_update_state()
-
-        hass.data[DOMAIN]["feed_unsub"] = async_track_time_interval(
-            hass, _periodic_update, timedelta(seconds=60)
-        )
-
     if (
         user in PRICE_LIST_USERS
         and "price_feed_add_entities" not in hass.data[DOMAIN]
@@ -95,17 +87,56 @@ async def async_setup_entry(
         data.setdefault("sensors", []).append(price_sensor)
         hass.data[DOMAIN]["price_list_feed_sensor"] = price_sensor
 
-        async def _price_periodic_update(_now):
-            sensor = hass.data[DOMAIN].get("price_list_feed_sensor")
-            if sensor is not None:
-                await sensor.async_update_state()
 
-        hass.data[DOMAIN]["price_feed_unsub"] = async_track_time_interval(
-            hass, _price_periodic_update, timedelta(seconds=60)
-        )
+@callback
+def async_schedule_sensor_updates(hass: HomeAssistant, sensors) -> None:
+    """Queue sensors for a state write at the end of the current loop tick.
+
+    A sensor queued several times before the flush is written once, and only
+    if its state differs from the last one written. Sensors without change
+    tracking (the log feeds) are refreshed through their own helpers.
+    """
+    pending = hass.data[DOMAIN].setdefault(PENDING_WRITES_KEY, {})
+    was_empty = not pending
+    for sensor in sensors:
+        if isinstance(sensor, TrackedStateMixin):
+            pending[id(sensor)] = sensor
+    if was_empty and pending:
+        hass.loop.call_soon(_async_flush_sensor_updates, hass)
+
+
+@callback
+def _async_flush_sensor_updates(hass: HomeAssistant) -> None:
+    pending = hass.data.get(DOMAIN, {}).pop(PENDING_WRITES_KEY, {})
+    for sensor in pending.values():
+        sensor.async_write_if_changed()
 
 
-class TallyListSensor(RestoreEntity, SensorEntity):
+class TrackedStateMixin:
+    """Remember the last written state so unchanged writes can be skipped."""
+
+    _written_state: tuple | None = None
+
+    def _unit(self) -> str:
+        return ""
+
+    @callback
+    def _async_write_tracked_state(self) -> None:
+        self._attr_native_unit_of_measurement = self._unit()
+        self._written_state = (self.native_value, self._attr_native_unit_of_measurement)
+        self.async_write_ha_state()
+
+    @callback
+    def async_write_if_changed(self) -> None:
+        """Write the state if value or unit changed since the last write."""
+        if getattr(self, "hass", None) is None:
+            return
+        if (self.native_value, self._unit()) == self._written_state:
+            return
+        self._async_write_tracked_state()
+
+
+class TallyListSensor(TrackedStateMixin, RestoreEntity, SensorEntity):
     def __init__(
         self,
         hass: HomeAssistant,
@@ -131,7 +162,10 @@ class TallyListSensor(RestoreEntity, SensorEntity):
         self._attr_icon = icon
 
     async def async_added_to_hass(self) -> None:
-        last_state = await self.async_get_last_state()
+        data = self._hass.data[DOMAIN][self._entry.entry_id]
+        # Counts come from the ledger store; restore state is only a fallback
+        # for users that have no stored record yet.
+        last_state = None if data.get("stored") else await self.async_get_last_state()
         if (
             last_state is not None
             and last_state.state not in (None, "unknown", "unavailable")
@@ -140,17 +174,12 @@ class TallyListSensor(RestoreEntity, SensorEntity):
                 restored = int(float(last_state.state))
             except ValueError:
                 restored = 0
-            counts = self._hass.data[DOMAIN][self._entry.entry_id].setdefault(
-                "counts",
-                {},
-            )
-            counts[self._drink] = restored
+            set_count(self._hass, data, self._drink, restored)
             self._attr_native_value = restored
         await self.async_update_state()
 
     async def async_update_state(self):
-        self._attr_native_unit_of_measurement = ""
-        self.async_write_ha_state()
+        self._async_write_tracked_state()
 
     @property
     def native_value(self):
@@ -161,7 +190,7 @@ class TallyListSensor(RestoreEntity, SensorEntity):
         return counts.get(self._drink, 0)
 
 
-class CurrencySensor(SensorEntity):
+class CurrencySensor(TrackedStateMixin, SensorEntity):
     """Base class for sensors that use the configured currency."""
 
     def __init__(self, hass: HomeAssistant) -> None:
@@ -175,11 +204,11 @@ class CurrencySensor(SensorEntity):
         await super().async_added_to_hass()
         await self.async_update_state()
 
+    def _unit(self) -> str:
+        return self._hass.data.get(DOMAIN, {}).get(CONF_CURRENCY, "€")
+
     async def async_update_state(self):
-        self._attr_native_unit_of_measurement = self._hass.data.get(
-            DOMAIN, {}
-        ).get(CONF_CURRENCY, "€")
-        self.async_write_ha_state()
+        self._async_write_tracked_state()
 
 
 class DrinkPriceSensor(CurrencySensor):
@@ -256,21 +285,7 @@ class TotalAmountSensor(CurrencySensor, RestoreEntity):
     @property
     def native_value(self):
         data = self._hass.data[DOMAIN][self._entry.entry_id]
-        counts = data.setdefault("counts", {})
-        total = 0.0
-        drinks = self._hass.data[DOMAIN].get("drinks", {})
-        for drink, price in drinks.items():
-            total += counts.get(drink, 0) * price
-        user = self._entry.data[CONF_USER]
-        cash_name = self._hass.data.get(DOMAIN, {}).get(CONF_CASH_USER_NAME, "")
-        if user.strip().lower() != cash_name.strip().lower():
-            free_amount = self._hass.data.get(DOMAIN, {}).get("free_amount", 0.0)
-            total -= free_amount
-            if total < 0:
-                total = 0.0
-        credit = data.get("credit", 0.0)
-        total -= credit
-        return round(total, 2)
+        return amount_due(self._hass, data, self._entry.data[CONF_USER])
 
 
 class CreditSensor(CurrencySensor, RestoreEntity):
@@ -295,14 +310,14 @@ class CreditSensor(CurrencySensor, RestoreEntity):
 
     async def async_added_to_hass(self) -> None:
         await super().async_added_to_hass()
-        last_state = await self.async_get_last_state()
+        data = self._hass.data[DOMAIN][self._entry.entry_id]
+        last_state = None if data.get("stored") else await self.async_get_last_state()
         if last_state and last_state.state not in (None, "unknown", "unavailable"):
             try:
                 restored = float(last_state.state)
             except ValueError:
                 restored = 0.0
-            data = self._hass.data[DOMAIN][self._entry.entry_id]
-            data["credit"] = restored
+            set_credit(self._hass, data, restored)
             self._attr_native_value = restored
         await self.async_update_state()
 
@@ -312,80 +327,119 @@ class CreditSensor(CurrencySensor, RestoreEntity):
         return round(data.get("credit", 0.0), 2)
 
 
-class FreeDrinkFeedSensor(SensorEntity):
+def _free_drink_entry(row: list[str], time_local: str) -> dict[str, str]:
+    return {
+        "time_local": time_local,
+        "name": row[1],
+        "drinks": row[2].replace(" x", " ×").replace(",", " •"),
+        "comment": row[3],
+    }
+
+
+def _price_list_entry(row: list[str], time_local: str) -> dict[str, str]:
+    return {
+        "time_local": time_local,
+        "user": row[1],
+        "action": row[2],
+        "details": row[3],
+    }
+
+
+class LogFeedSensor(SensorEntity):
+    """Base class for sensors that expose the newest rows of yearly CSV logs.
+
+    ``row_to_entry`` converts a validated log row and its local time into a
+    feed entry. Feeds are not polled. The integration refreshes them whenever
+    it writes a log row; edits made outside Home Assistant are picked up by
+    calling ``homeassistant.update_entity`` for the feed sensor.
+    """
+
+    _log_pattern: str
+    _log_kind: str
+
     def __init__(
-        self, hass: HomeAssistant, entry: ConfigEntry, max_entries: int = 20
+        self,
+        hass: HomeAssistant,
+        base_dir: str,
+        row_to_entry: Callable[[list[str], str], dict[str, str]],
+        max_entries: int = 20,
     ) -> None:
         self._hass = hass
+        self._row_to_entry = row_to_entry
         self._max_entries = max_entries
         self._attr_should_poll = False
-        self._attr_name = _local_suffix(
-            hass, "Free drinks feed", "Freigetränke Feed"
-        )
-        self.entity_id = "sensor.free_drink_feed"
-        self._attr_unique_id = f"{entry.entry_id}_free_drink_feed"
-        self._base_dir = hass.config.path("tally_list", "free_drinks")
+        self._base_dir = base_dir
+        self._signature: tuple | None = None
         self._entries: list[dict[str, str]] = []
         self._attr_native_value = "none"
-        self._attr_icon = "mdi:clipboard-list"
-
-    @property
-    def icon(self) -> str:
-        """Return the icon for the free drink feed sensor."""
-        return "mdi:clipboard-list"
 
     async def async_added_to_hass(self) -> None:
         await self.async_update_state()
 
-    def _read_rows(self) -> list[list[str]]:
-        rows: list[list[str]] = []
+    async def async_update(self) -> None:
+        """Refresh on ``homeassistant.update_entity`` for external log edits."""
+        await self.async_update_state()
+
+    def _log_signature(self) -> tuple[tuple[str, int, int], ...]:
+        """Return name, size and mtime of all yearly logs, newest first."""
         if not os.path.isdir(self._base_dir):
-            return rows
+            return ()
+        signature = []
         for name in os.listdir(self._base_dir):
-            if not re.match(r"free_drinks_\d{4}\.csv$", name):
+            if not re.match(self._log_pattern, name):
                 continue
+            stat = os.stat(os.path.join(self._base_dir, name))
+            signature.append((name, stat.st_size, stat.st_mtime_ns))
+        signature.sort(reverse=True)
+        return tuple(signature)
+
+    def _read_entries(
+        self, known: tuple | None
+    ) -> tuple[tuple, list[dict[str, str]] | None]:
+        """Read the newest feed entries if the logs changed since ``known``.
+
+        Files are read backwards starting with the newest year, so only the
+        last ``max_entries`` rows are parsed regardless of the log size.
+        """
+        signature = self._log_signature()
+        if signature == known:
+            return signature, None
+        entries: list[dict[str, str]] = []
+        for name, _size, _mtime in signature:
             path = os.path.join(self._base_dir, name)
-            with open(path, "r", encoding="utf-8", newline="") as csvfile:
-                reader = csv.reader(csvfile, delimiter=";")
+            for row in iter_csv_rows_reversed(path):
+                if len(row) != 4:
+                    _LOGGER.warning(
+                        "Skipping malformed %s row: %s", self._log_kind, row
+                    )
+                    continue
                 try:
-                    next(reader)
-                except StopIteration:
+                    dt = datetime.strptime(row[0], "%Y-%m-%dT%H:%M")
+                    time_local = dt.strftime("%Y-%m-%d %H:%M")
+                except Exception:
+                    _LOGGER.warning(
+                        "Skipping %s row with bad time: %s", self._log_kind, row
+                    )
                     continue
-                rows.extend(list(reader))
-        rows.sort(key=lambda r: r[0])
-        return list(deque(rows, maxlen=self._max_entries))
+                entries.append(self._row_to_entry(row, time_local))
+                if len(entries) >= self._max_entries:
+                    return signature, entries
+        return signature, entries
 
     async def async_update_state(self) -> None:
         try:
-            rows = await self._hass.async_add_executor_job(self._read_rows)
+            signature, entries = await self._hass.async_add_executor_job(
+                self._read_entries, self._signature
+            )
         except OSError as err:
             _LOGGER.warning(
-                "Failed reading free drink logs %s: %s", self._base_dir, err
+                "Failed reading %s logs %s: %s", self._log_kind, self._base_dir, err
             )
             return
+        if entries is None:
+            return
 
-        entries: list[dict[str, str]] = []
-        for row in reversed(rows):
-            if len(row) != 4:
-                _LOGGER.warning("Skipping malformed free drink row: %s", row)
-                continue
-            try:
-                dt = datetime.strptime(row[0], "%Y-%m-%dT%H:%M")
-                time_local = dt.strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                _LOGGER.warning(
-                    "Skipping free drink row with bad time: %s", row
-                )
-                continue
-            entries.append(
-                {
-                    "time_local": time_local,
-                    "name": row[1],
-                    "drinks": row[2].replace(" x", " ×").replace(",", " •"),
-                    "comment": row[3],
-                }
-            )
-
+        self._signature = signature
         self._entries = entries
         if entries:
             self._attr_native_value = entries[0]["time_local"]
@@ -398,86 +452,51 @@ class FreeDrinkFeedSensor(SensorEntity):
         return {"entries": self._entries}
 
 
-class PriceListFeedSensor(SensorEntity):
+class FreeDrinkFeedSensor(LogFeedSensor):
+    _log_pattern = r"free_drinks_\d{4}\.csv$"
+    _log_kind = "free drink"
+
     def __init__(
         self, hass: HomeAssistant, entry: ConfigEntry, max_entries: int = 20
     ) -> None:
-        self._hass = hass
-        self._max_entries = max_entries
-        self._attr_should_poll = False
-        self._attr_name = _local_suffix(hass, "Price list feed", "Preisliste Feed")
-        self.entity_id = "sensor.price_list_feed"
-        self._attr_unique_id = f"{entry.entry_id}_price_list_feed"
-        self._base_dir = hass.config.path("tally_list", "price_list")
-        self._entries: list[dict[str, str]] = []
-        self._attr_native_value = "none"
-        self._attr_icon = "mdi:clipboard-edit"
+        super().__init__(
+            hass,
+            hass.config.path("tally_list", "free_drinks"),
+            _free_drink_entry,
+            max_entries,
+        )
+        self._attr_name = _local_suffix(
+            hass, "Free drinks feed", "Freigetränke Feed"
+        )
+        self.entity_id = "sensor.free_drink_feed"
+        self._attr_unique_id = f"{entry.entry_id}_free_drink_feed"
+        self._attr_icon = "mdi:clipboard-list"
 
     @property
     def icon(self) -> str:
-        """Return the icon for the price list feed sensor."""
-        return "mdi:clipboard-edit"
-
-    async def async_added_to_hass(self) -> None:
-        await self.async_update_state()
-
-    def _read_rows(self) -> list[list[str]]:
-        rows: list[list[str]] = []
-        if not os.path.isdir(self._base_dir):
-            return rows
-        for name in os.listdir(self._base_dir):
-            if not re.match(r"price_list_\d{4}\.csv$", name):
-                continue
-            path = os.path.join(self._base_dir, name)
-            with open(path, "r", encoding="utf-8", newline="") as csvfile:
-                reader = csv.reader(csvfile, delimiter=";")
-                try:
-                    next(reader)
-                except StopIteration:
-                    continue
-                rows.extend(list(reader))
-        return rows
+        """Return the icon for the free drink feed sensor."""
+        return "mdi:clipboard-list"
 
-    async def async_update_state(self) -> None:
-        try:
-            rows = await self._hass.async_add_executor_job(self._read_rows)
-        except OSError as err:
-            _LOGGER.warning(
-                "Failed reading price list logs %s: %s", self._base_dir, err
-            )
-            return
 
-        entries: list[dict[str, str]] = []
-        for row in rows:
-            if len(row) != 4:
-                _LOGGER.warning("Skipping malformed price list row: %s", row)
-                continue
-            try:
-                dt = datetime.strptime(row[0], "%Y-%m-%dT%H:%M")
-                time_local = dt.strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                _LOGGER.warning("Skipping price list row with bad time: %s", row)
-                continue
-            entries.append(
-                {
-                    "time_local": time_local,
-                    "user": row[1],
-                    "action": row[2],
-                    "details": row[3],
-                    "dt": dt,
-                }
-            )
+class PriceListFeedSensor(LogFeedSensor):
+    _log_pattern = r"price_list_\d{4}\.csv$"
+    _log_kind = "price list"
 
-        entries.sort(key=lambda e: e["dt"], reverse=True)
-        entries = entries[: self._max_entries]
-        self._entries = [
-            {k: v for k, v in entry.items() if k != "dt"} for entry in entries
-        ]
-        self._attr_native_value = (
-            self._entries[0]["time_local"] if self._entries else "none"
+    def __init__(
+        self, hass: HomeAssistant, entry: ConfigEntry, max_entries: int = 20
+    ) -> None:
+        super().__init__(
+            hass,
+            hass.config.path("tally_list", "price_list"),
+            _price_list_entry,
+            max_entries,
         )
-        self.async_write_ha_state()
+        self._attr_name = _local_suffix(hass, "Price list feed", "Preisliste Feed")
+        self.entity_id = "sensor.price_list_feed"
+        self._attr_unique_id = f"{entry.entry_id}_price_list_feed"
+        self._attr_icon = "mdi:clipboard-edit"
 
     @property
-    def extra_state_attributes(self) -> dict[str, list[dict[str, str]]]:
-        return {"entries": self._entries}
+    def icon(self) -> str:
+        """Return the icon for the price list feed sensor."""
+        return "mdi:clipboard-edit"
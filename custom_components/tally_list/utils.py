@@ -2,6 +2,10 @@
 
 from __future__ import annotations
 
+import csv
+import io
+import os
+from collections.abc import Iterator
 from typing import Any, TYPE_CHECKING
 
 try:
@@ -25,9 +29,39 @@ else:  # pragma: no cover - used only for type hints
     HomeAssistant = Any
 
 try:
-    from .const import DOMAIN, CONF_CASH_USER_NAME, CASH_USER_SLUG
+    from .const import (
+        DOMAIN,
+        CONF_CASH_USER_NAME,
+        CONF_EXCLUDED_USERS,
+        CONF_OVERRIDE_USERS,
+        CONF_PUBLIC_DEVICES,
+        CONF_USER,
+        CASH_USER_SLUG,
+    )
 except Exception:  # pragma: no cover - direct import for tests
-    from const import DOMAIN, CONF_CASH_USER_NAME, CASH_USER_SLUG
+    from const import (
+        DOMAIN,
+        CONF_CASH_USER_NAME,
+        CONF_EXCLUDED_USERS,
+        CONF_OVERRIDE_USERS,
+        CONF_PUBLIC_DEVICES,
+        CONF_USER,
+        CASH_USER_SLUG,
+    )
+
+
+# Key of the user ID to person name cache in hass.data[DOMAIN]; kept up to
+# date from person state changes.
+PERSON_CACHE_KEY = "person_names"
+# Key of the cached users × drinks matrix in hass.data[DOMAIN]; dropped
+# whenever the set of users or the ledger changes.
+SNAPSHOT_CACHE_KEY = "snapshot_cache"
+# Key of the permission table in hass.data[DOMAIN]; dropped whenever persons
+# or the access lists change.
+PERMISSIONS_KEY = "permissions"
+# Options stored as lists whose frozenset mirrors are used for membership
+# checks; the mirror of ``key`` lives under ``f"{key}_set"``.
+ACCESS_LIST_KEYS = (CONF_EXCLUDED_USERS, CONF_OVERRIDE_USERS, CONF_PUBLIC_DEVICES)
 
 
 def get_person_name(hass: HomeAssistant, user_id: str | None) -> str | None:
@@ -40,16 +74,120 @@ def get_person_name(hass: HomeAssistant, user_id: str | None) -> str | None:
     Returns:
         The name of the person entity linked to the user ID, or ``None`` if no
         matching person is found or ``user_id`` is ``None``.
+
+    Uses the cache maintained by :func:`update_person_cache` when available
+    and falls back to scanning all person states otherwise.
     """
     if user_id is None:
         return None
 
+    cache = hass.data.get(DOMAIN, {}).get(PERSON_CACHE_KEY)
+    if cache is not None:
+        return cache.get(user_id)
+
     for state in hass.states.async_all("person"):
         if state.attributes.get("user_id") == user_id:
             return state.name
     return None
 
 
+def build_person_cache(hass: HomeAssistant) -> dict[str, str]:
+    """Build the user ID to person name cache from the current states."""
+    cache: dict[str, str] = {}
+    for state in hass.states.async_all("person"):
+        user_id = state.attributes.get("user_id")
+        if user_id:
+            cache[user_id] = state.name
+    hass.data.setdefault(DOMAIN, {})[PERSON_CACHE_KEY] = cache
+    invalidate_permissions(hass)
+    return cache
+
+
+def _person_identity(state) -> tuple[str, str | None] | None:
+    if state is None:
+        return None
+    return state.name, state.attributes.get("user_id")
+
+
+def update_person_cache(hass: HomeAssistant, old_state, new_state) -> None:
+    """Apply a person state change to the user ID to person name cache.
+
+    Location updates keep the name and the user ID and are ignored, so the
+    permission table is only rebuilt when a person really changes.
+    """
+    cache = hass.data.get(DOMAIN, {}).get(PERSON_CACHE_KEY)
+    if cache is None:
+        return
+    if _person_identity(old_state) == _person_identity(new_state):
+        return
+    invalidate_permissions(hass)
+    if old_state is not None:
+        user_id = old_state.attributes.get("user_id")
+        if user_id and cache.get(user_id) == old_state.name:
+            del cache[user_id]
+    if new_state is not None:
+        user_id = new_state.attributes.get("user_id")
+        if user_id:
+            cache[user_id] = new_state.name
+
+
+def invalidate_permissions(hass: HomeAssistant) -> None:
+    """Drop the permission table so it is rebuilt on the next lookup."""
+    hass.data.get(DOMAIN, {}).pop(PERMISSIONS_KEY, None)
+
+
+def access_set(hass: HomeAssistant, key: str) -> frozenset[str]:
+    """Return the frozenset mirror of the access list option ``key``."""
+    domain_data = hass.data.get(DOMAIN, {})
+    mirror = domain_data.get(f"{key}_set")
+    if mirror is None:
+        mirror = frozenset(domain_data.get(key) or ())
+        if DOMAIN in hass.data:
+            domain_data[f"{key}_set"] = mirror
+    return mirror
+
+
+def refresh_access_lists(hass: HomeAssistant) -> None:
+    """Rebuild the access list mirrors after the options changed."""
+    domain_data = hass.data.get(DOMAIN)
+    if domain_data is None:
+        return
+    for key in ACCESS_LIST_KEYS:
+        domain_data[f"{key}_set"] = frozenset(domain_data.get(key) or ())
+    invalidate_permissions(hass)
+
+
+def get_user_permissions(hass: HomeAssistant, user_id: str | None) -> dict | None:
+    """Return the permissions of the Home Assistant user ``user_id``.
+
+    The result holds the linked person ``name`` and whether that person is an
+    ``admin`` (override user) or a ``public`` device. ``None`` is returned
+    for users without a person. The table covering all users is built from
+    the person cache on first use, so a lookup is a single dict access.
+    """
+    if user_id is None:
+        return None
+    domain_data = hass.data.get(DOMAIN, {})
+    table = domain_data.get(PERMISSIONS_KEY)
+    if table is None:
+        persons = domain_data.get(PERSON_CACHE_KEY)
+        if persons is None:
+            persons = build_person_cache(hass)
+        admins = access_set(hass, CONF_OVERRIDE_USERS)
+        public = access_set(hass, CONF_PUBLIC_DEVICES)
+        table = {
+            person_user_id: {
+                "name": name,
+                "admin": name in admins,
+                "public": name in public,
+            }
+            for person_user_id, name in persons.items()
+        }
+        if DOMAIN in hass.data:
+            domain_data[PERMISSIONS_KEY] = table
+    return table.get(user_id)
+
+
 def get_user_slug(hass: HomeAssistant, username: str) -> str:
     """Return the slug for a user name.
 
@@ -59,3 +197,137 @@ def get_user_slug(hass: HomeAssistant, username: str) -> str:
     if username.strip().lower() == cash_name.strip().lower():
         return CASH_USER_SLUG
     return slugify(username)
+
+
+def _normalize_user(name: str) -> str:
+    return name.strip().lower()
+
+
+def register_user_entry(hass: HomeAssistant, data: dict) -> None:
+    """Add the runtime data of a config entry to the user name index.
+
+    The index maps user names (exact and normalized) to the dictionaries
+    stored under ``hass.data[DOMAIN][entry_id]`` so services can resolve a
+    user without scanning all entries.
+    """
+    name = data["entry"].data.get(CONF_USER)
+    if not name:
+        return
+    domain_data = hass.data[DOMAIN]
+    domain_data.pop(SNAPSHOT_CACHE_KEY, None)
+    domain_data.setdefault("user_index", {})[name] = data
+    domain_data.setdefault("user_index_normalized", {})[
+        _normalize_user(name)
+    ] = data
+
+
+def unregister_user_entry(hass: HomeAssistant, data: dict) -> None:
+    """Remove the runtime data of a config entry from the user name index."""
+    name = data["entry"].data.get(CONF_USER)
+    if not name:
+        return
+    domain_data = hass.data.get(DOMAIN, {})
+    domain_data.pop(SNAPSHOT_CACHE_KEY, None)
+    index = domain_data.get("user_index", {})
+    if index.get(name) is data:
+        del index[name]
+    normalized = domain_data.get("user_index_normalized", {})
+    if normalized.get(_normalize_user(name)) is data:
+        del normalized[_normalize_user(name)]
+
+
+def find_user_entry(
+    hass: HomeAssistant, name: str, normalized: bool = False
+) -> dict | None:
+    """Return the runtime data of the entry for ``name``.
+
+    With ``normalized`` set, surrounding whitespace and case are ignored.
+    """
+    domain_data = hass.data.get(DOMAIN, {})
+    if normalized:
+        return domain_data.get("user_index_normalized", {}).get(
+            _normalize_user(name)
+        )
+    return domain_data.get("user_index", {}).get(name)
+
+
+def user_entries(hass: HomeAssistant) -> list[dict]:
+    """Return the runtime data of all registered user entries."""
+    return list(hass.data.get(DOMAIN, {}).get("user_index", {}).values())
+
+
+_TAIL_CHUNK_SIZE = 4096
+
+
+def read_last_csv_row(
+    path: str, delimiter: str = ";"
+) -> tuple[int, list[str] | None]:
+    """Return the byte offset and parsed content of the last CSV row.
+
+    Only the tail of the file is read, so the cost does not depend on the
+    number of rows the file already holds. An offset of ``0`` means the last
+    row is the first line of the file (usually the header). ``(0, None)`` is
+    returned for an empty file.
+    """
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        pos = file.tell()
+        data = b""
+        start = 0
+        while pos > 0:
+            step = min(_TAIL_CHUNK_SIZE, pos)
+            pos -= step
+            file.seek(pos)
+            data = file.read(step) + data
+            index = data.rstrip(b"\r\n").rfind(b"\n")
+            if index != -1:
+                start = pos + index + 1
+                data = data[index + 1 :]
+                break
+    line = data.rstrip(b"\r\n").decode("utf-8")
+    if not line:
+        return start, None
+    return start, next(csv.reader([line], delimiter=delimiter), None)
+
+
+def rewrite_csv_tail(
+    path: str, offset: int, rows: list[list[str]], delimiter: str = ";"
+) -> None:
+    """Replace everything after ``offset`` in a CSV file with ``rows``.
+
+    Combined with :func:`read_last_csv_row` this allows updating or appending
+    the last row of a log without rewriting the preceding rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL)
+    writer.writerows(rows)
+    mode = "r+b" if os.path.exists(path) else "wb"
+    with open(path, mode) as file:
+        file.seek(offset)
+        file.truncate()
+        file.write(buffer.getvalue().encode("utf-8"))
+
+
+def iter_csv_rows_reversed(path: str, delimiter: str = ";") -> Iterator[list[str]]:
+    """Yield the data rows of a CSV file from the last to the first one.
+
+    The file is read backwards in fixed-size chunks, so callers that only need
+    the newest rows can stop early without touching older parts of the file.
+    The first line (the header) is never yielded.
+    """
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        pos = file.tell()
+        remainder = b""
+        while pos > 0:
+            step = min(_TAIL_CHUNK_SIZE, pos)
+            pos -= step
+            file.seek(pos)
+            lines = (file.read(step) + remainder).split(b"\n")
+            # The first element may be an incomplete line; keep it for the
+            # next chunk. Once the start is reached it is the header.
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                line = line.rstrip(b"\r")
+                if line:
+                    yield next(csv.reader([line.decode("utf-8")], delimiter=delimiter))
@@ -2,19 +2,29 @@
 
 from __future__ import annotations
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.components import websocket_api
-from homeassistant.exceptions import Unauthorized
+from homeassistant.exceptions import HomeAssistantError, Unauthorized
 import voluptuous as vol
 
 from .const import (
     DOMAIN,
+    ATTR_COMMENT,
+    ATTR_DRINK,
+    ATTR_FREE_DRINK,
+    ATTR_ITEMS,
+    ATTR_PIN,
+    ATTR_USER,
+    SERVICE_ADD_DRINKS_BATCH,
     CONF_OVERRIDE_USERS,
-    CONF_PUBLIC_DEVICES,
     CONF_USER_PINS,
 )
-from .security import verify_pin
-from .utils import get_person_name
+from .ledger import async_subscribe, snapshot_matrix, snapshot_payload
+from .utils import get_user_permissions
+
+# PINs are coerced to strings everywhere: clients and YAML service calls may
+# send numeric PINs as numbers.
+PIN_VALIDATOR = vol.Coerce(str)
 
 
 @websocket_api.websocket_command({vol.Required("type"): f"{DOMAIN}/get_admins"})
@@ -43,17 +53,17 @@ async def websocket_is_public_device(
     if connection.user is None:
         raise Unauthorized
 
-    person_name = get_person_name(hass, connection.user.id)
-
-    public_devices = hass.data.get(DOMAIN, {}).get(CONF_PUBLIC_DEVICES, [])
-    connection.send_result(msg["id"], {"is_public": person_name in public_devices})
+    permissions = get_user_permissions(hass, connection.user.id)
+    connection.send_result(
+        msg["id"], {"is_public": permissions is not None and permissions["public"]}
+    )
 
 
 @websocket_api.websocket_command(
     {
         vol.Required("type"): f"{DOMAIN}/login",
         vol.Required("user"): str,
-        vol.Required("pin"): str,
+        vol.Required(ATTR_PIN): PIN_VALIDATOR,
     }
 )
 @websocket_api.async_response
@@ -66,15 +76,18 @@ async def websocket_login(
     if connection.user is None:
         raise Unauthorized
 
-    person_name = get_person_name(hass, connection.user.id)
-
-    public_devices = hass.data.get(DOMAIN, {}).get(CONF_PUBLIC_DEVICES, [])
+    permissions = get_user_permissions(hass, connection.user.id)
     user_pins = hass.data.get(DOMAIN, {}).get(CONF_USER_PINS, {})
-    if person_name not in public_devices:
+    if permissions is None or not permissions["public"]:
         raise Unauthorized
 
     stored_pin = user_pins.get(msg["user"])
-    if stored_pin and verify_pin(str(msg["pin"]), stored_pin):
+    verified = bool(stored_pin) and await hass.data[DOMAIN][
+        "pin_cache"
+    ].async_verify(
+        hass, connection.user.id, msg["user"], msg[ATTR_PIN], stored_pin
+    )
+    if verified:
         hass.data[DOMAIN].setdefault("logins", {})[
             connection.user.id
         ] = msg["user"]
@@ -98,9 +111,100 @@ async def websocket_logout(
     connection.send_result(msg["id"], {"success": True})
 
 
+# One booking of the add_drinks_batch service and WebSocket command.
+BATCH_ITEM_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_USER): str,
+        vol.Required(ATTR_DRINK): str,
+        vol.Optional("count", default=1): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(ATTR_FREE_DRINK, default=False): bool,
+        vol.Optional(ATTR_COMMENT, default=""): str,
+        vol.Optional(ATTR_PIN): PIN_VALIDATOR,
+    }
+)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/add_drinks_batch",
+        vol.Required(ATTR_ITEMS): [BATCH_ITEM_SCHEMA],
+        vol.Optional(ATTR_PIN): PIN_VALIDATOR,
+    }
+)
+@websocket_api.async_response
+async def websocket_add_drinks_batch(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict,
+) -> None:
+    """Book several drinks for one or more users in a single call."""
+    if connection.user is None:
+        raise Unauthorized
+
+    service_data = {ATTR_ITEMS: msg[ATTR_ITEMS]}
+    if ATTR_PIN in msg:
+        service_data[ATTR_PIN] = msg[ATTR_PIN]
+    try:
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_ADD_DRINKS_BATCH,
+            service_data,
+            blocking=True,
+            context=connection.context(msg),
+        )
+    except Unauthorized:
+        raise
+    except HomeAssistantError as err:
+        connection.send_error(msg["id"], "booking_failed", str(err))
+        return
+    connection.send_result(msg["id"], {"success": True})
+
+
+@websocket_api.websocket_command({vol.Required("type"): f"{DOMAIN}/get_snapshot"})
+@websocket_api.async_response
+async def websocket_get_snapshot(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict,
+) -> None:
+    """Return counts, prices, credits and totals of all users at once."""
+    if connection.user is None:
+        raise Unauthorized
+
+    connection.send_result(msg["id"], snapshot_matrix(hass))
+
+
+@websocket_api.websocket_command({vol.Required("type"): f"{DOMAIN}/subscribe"})
+@callback
+def websocket_subscribe(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict,
+) -> None:
+    """Push ledger changes to the client.
+
+    The first event carries a ``snapshot`` of all users. Afterwards each event
+    holds the ``changes`` of one booking round: the user, the changed drink
+    counts, the credit and the new total.
+    """
+    if connection.user is None:
+        raise Unauthorized
+
+    @callback
+    def _forward(payload: dict) -> None:
+        connection.send_message(websocket_api.event_message(msg["id"], payload))
+
+    connection.subscriptions[msg["id"]] = async_subscribe(hass, _forward)
+    connection.send_result(msg["id"])
+    _forward({"snapshot": snapshot_payload(hass)})
+
+
 async def async_register(hass: HomeAssistant) -> None:
     """Register Tally List WebSocket commands."""
     websocket_api.async_register_command(hass, websocket_get_admins)
     websocket_api.async_register_command(hass, websocket_is_public_device)
     websocket_api.async_register_command(hass, websocket_login)
     websocket_api.async_register_command(hass, websocket_logout)
+    websocket_api.async_register_command(hass, websocket_add_drinks_batch)
+    websocket_api.async_register_command(hass, websocket_get_snapshot)
+    websocket_api.async_register_command(hass, websocket_subscribe)
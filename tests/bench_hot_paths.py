@@ -0,0 +1,317 @@
+"""Benchmarks for the hot paths of the integration.
+
+Run from the repository root::
+
+    python tests/bench_hot_paths.py [--scale 0.1] [--json]
+
+Home Assistant is replaced by the same stubs the service tests use, so the
+numbers cover the integration code and file I/O only. Service benchmarks
+run executor jobs in a real thread pool, so event loop gaps show what the
+loop would see in Home Assistant. Each benchmark prints
+p50/p90/p99/max in milliseconds; compare runs before and after a change.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import statistics
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from pathlib import Path
+
+from ha_env import add_user, service_call, setup_env
+
+LOG_SIZES = (1_000, 10_000, 100_000)
+
+
+def _summary(name: str, samples: list[float]) -> dict:
+    samples_ms = [sample * 1000 for sample in samples]
+    cuts = statistics.quantiles(samples_ms, n=100, method="inclusive")
+    return {
+        "name": name,
+        "n": len(samples_ms),
+        "p50": cuts[49],
+        "p90": cuts[89],
+        "p99": cuts[98],
+        "max": max(samples_ms),
+    }
+
+
+def _fill_log(path: Path, header: str, row: str, rows: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(header)
+        for i in range(rows):
+            file.write(row.format(i=i, minute=i % 60))
+
+
+async def _heartbeat(done: asyncio.Event, gaps: list[float]) -> None:
+    """Record the time between loop iterations until ``done`` is set."""
+    last = time.perf_counter()
+    while not done.is_set():
+        await asyncio.sleep(0)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+
+async def _bench_add_drink(tmp: Path, iterations: int) -> list[dict]:
+    executor = ThreadPoolExecutor()
+    hass, integration, const, utils, cleanup = setup_env(tmp, executor)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0, "Limo": 1.5}
+        add_user(hass, const, utils, "a", "Alice")
+        add_user(hass, const, utils, "b", "Bob")
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINK]
+        samples = []
+        gaps: list[float] = []
+        done = asyncio.Event()
+        beat = asyncio.create_task(_heartbeat(done, gaps))
+        for i in range(iterations):
+            # Alternate users so every call appends a new price list row
+            # instead of growing one aggregated row.
+            call = service_call(
+                {"user": ("Alice", "Bob")[i % 2], "drink": "Bier"}
+            )
+            start = time.perf_counter()
+            await handler(call)
+            samples.append(time.perf_counter() - start)
+            await asyncio.sleep(0)
+        done.set()
+        await beat
+        await hass.data[const.DOMAIN]["log_writer"].async_flush()
+        await hass.data[const.DOMAIN]["ledger_journal"].async_flush()
+        return [
+            _summary("add_drink_service", samples),
+            _summary("event loop gap during bookings", gaps),
+        ]
+    finally:
+        cleanup()
+        executor.shutdown()
+
+
+async def _bench_pin_bookings(
+    tmp: Path, rounds: int, concurrency: int = 8
+) -> list[dict]:
+    executor = ThreadPoolExecutor()
+    hass, integration, const, utils, cleanup = setup_env(tmp, executor)
+    try:
+        await integration.async_setup(hass, {})
+        security = import_module("tally_list.security")
+        domain = hass.data[const.DOMAIN]
+        domain["drinks"] = {"Bier": 2.0}
+        users = [f"User{i}" for i in range(concurrency)]
+        for i, user in enumerate(users):
+            add_user(hass, const, utils, f"u{i}", user)
+        stored = security.hash_pin("1234")
+        domain[const.CONF_USER_PINS] = {user: stored for user in users}
+        domain[const.CONF_PUBLIC_DEVICES] = ["Tablet"]
+        domain[utils.PERSON_CACHE_KEY] = {"tablet": "Tablet"}
+        utils.refresh_access_lists(hass)
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINK]
+        samples: list[float] = []
+        gaps: list[float] = []
+
+        async def _book(user: str) -> None:
+            call = service_call(
+                {"user": user, "drink": "Bier", "pin": "1234"}, user_id="tablet"
+            )
+            start = time.perf_counter()
+            await handler(call)
+            samples.append(time.perf_counter() - start)
+
+        done = asyncio.Event()
+        beat = asyncio.create_task(_heartbeat(done, gaps))
+        for _ in range(rounds):
+            # A fresh cache makes every booking derive its PIN key, as when
+            # several tablets book for different users at once.
+            domain["pin_cache"] = security.PinVerificationCache()
+            await asyncio.gather(*(_book(user) for user in users))
+        done.set()
+        await beat
+        await domain["log_writer"].async_flush()
+        await domain["ledger_journal"].async_flush()
+        return [
+            _summary(f"add_drink with PIN x{concurrency}", samples),
+            _summary(f"event loop gap PIN bookings x{concurrency}", gaps),
+        ]
+    finally:
+        cleanup()
+        executor.shutdown()
+
+
+async def _bench_price_list_log(tmp: Path, iterations: int) -> list[dict]:
+    results = []
+    for size in LOG_SIZES:
+        hass, _integration, _const, _utils, cleanup = setup_env(tmp / f"log{size}")
+        try:
+            config_flow = import_module("tally_list.config_flow")
+            log_dir = tmp / f"log{size}" / "tally_list" / "price_list"
+            _fill_log(
+                log_dir / "price_list_2025.csv",
+                "Time;User;Action;Details\n",
+                "2025-01-01T10:{minute:02d};User{i};add_drink;User{i}:Bier+1\n",
+                size,
+            )
+            samples = []
+            for i in range(iterations):
+                start = time.perf_counter()
+                config_flow._write_price_list_log(
+                    hass, f"Bench{i % 2}", "add_drink", "Alice:Bier+1"
+                )
+                samples.append(time.perf_counter() - start)
+            results.append(_summary(f"_write_price_list_log rows={size}", samples))
+        finally:
+            cleanup()
+    return results
+
+
+async def _bench_csv_tail(tmp: Path, iterations: int) -> list[dict]:
+    _hass, _integration, _const, _utils, cleanup = setup_env(tmp / "tail")
+    try:
+        utils = import_module("tally_list.utils")
+        results = []
+        for size in LOG_SIZES:
+            path = tmp / "tail" / f"tail{size}.csv"
+            _fill_log(
+                path,
+                "Time;User;Action;Details\n",
+                "2025-01-01T10:{minute:02d};User{i};add_drink;User{i}:Bier+1\n",
+                size,
+            )
+            tail, full = [], []
+            for i in range(iterations):
+                # Update the last row in place, as the log writers do.
+                start = time.perf_counter()
+                offset, last = utils.read_last_csv_row(str(path))
+                last[3] = f"Bench:Bier+{i}"
+                utils.rewrite_csv_tail(str(path), offset, [last])
+                tail.append(time.perf_counter() - start)
+            for i in range(iterations):
+                # Baseline: read and rewrite the whole file.
+                start = time.perf_counter()
+                with open(path, newline="", encoding="utf-8") as file:
+                    rows = list(csv.reader(file, delimiter=";"))
+                rows[-1][3] = f"Bench:Bier+{i}"
+                with open(path, "w", newline="", encoding="utf-8") as file:
+                    csv.writer(file, delimiter=";").writerows(rows)
+                full.append(time.perf_counter() - start)
+            results.append(_summary(f"csv tail rewrite rows={size}", tail))
+            results.append(_summary(f"csv full rewrite rows={size}", full))
+        return results
+    finally:
+        cleanup()
+
+
+async def _bench_feed_refresh(tmp: Path, iterations: int) -> list[dict]:
+    results = []
+    for size in LOG_SIZES:
+        hass, _integration, _const, _utils, cleanup = setup_env(tmp / f"feed{size}")
+        try:
+            sensor_mod = import_module("tally_list.sensor")
+            log_dir = tmp / f"feed{size}" / "tally_list" / "free_drinks"
+            _fill_log(
+                log_dir / "free_drinks_2025.csv",
+                "Uhrzeit;Name;Getränke mit Anzahl;Kommentar\n",
+                "2025-01-01T10:{minute:02d};User{i};Bier x1;Geburtstag\n",
+                size,
+            )
+            entry = types.SimpleNamespace(entry_id="cash", data={})
+            sensor = sensor_mod.FreeDrinkFeedSensor(hass, entry)
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                # ``None`` forces a full read as after a log change.
+                sensor._read_entries(None)
+                samples.append(time.perf_counter() - start)
+            results.append(_summary(f"feed refresh rows={size}", samples))
+        finally:
+            cleanup()
+    return results
+
+
+async def _bench_pin(tmp: Path, iterations: int) -> list[dict]:
+    executor = ThreadPoolExecutor()
+    hass, _integration, _const, _utils, cleanup = setup_env(tmp, executor)
+    try:
+        security = import_module("tally_list.security")
+        stored = security.hash_pin("1234")
+        samples = []
+        for _ in range(max(iterations // 10, 5)):
+            start = time.perf_counter()
+            security.verify_pin("1234", stored)
+            samples.append(time.perf_counter() - start)
+        cache = security.PinVerificationCache()
+        cache.add("tablet", "Alice", "1234", stored)
+        cached = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            cache.contains("tablet", "Alice", "1234", stored)
+            cached.append(time.perf_counter() - start)
+
+        # Concurrent checks in the thread pool, as on a busy public device.
+        gaps: list[float] = []
+        done = asyncio.Event()
+        beat = asyncio.create_task(_heartbeat(done, gaps))
+        for _ in range(max(iterations // 50, 2)):
+            await asyncio.gather(
+                *(security.async_verify_pin(hass, "1234", stored) for _ in range(8))
+            )
+        done.set()
+        await beat
+        return [
+            _summary("verify_pin (PBKDF2)", samples),
+            _summary("verify_pin (cache hit)", cached),
+            _summary("event loop gap verify_pin x8", gaps),
+        ]
+    finally:
+        cleanup()
+        executor.shutdown()
+
+
+async def _run(scale: float) -> list[dict]:
+    iterations = max(int(500 * scale), 10)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        results += await _bench_add_drink(tmp_path / "service", iterations)
+        results += await _bench_pin_bookings(
+            tmp_path / "pin", max(iterations // 50, 2)
+        )
+        results += await _bench_price_list_log(tmp_path, max(iterations // 2, 10))
+        results += await _bench_csv_tail(tmp_path, max(iterations // 10, 10))
+        results += await _bench_feed_refresh(tmp_path, max(iterations // 5, 10))
+        results += await _bench_pin(tmp_path / "security", iterations)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="multiply iteration counts"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args()
+    results = asyncio.run(_run(args.scale))
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    print(f"{'benchmark':<40}{'n':>6}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for result in results:
+        print(
+            f"{result['name']:<40}{result['n']:>6}"
+            f"{result['p50']:>10.3f}{result['p90']:>10.3f}"
+            f"{result['p99']:>10.3f}{result['max']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
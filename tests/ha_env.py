@@ -0,0 +1,351 @@
+"""Home Assistant stubs shared by the tests and the benchmarks.
+
+``setup_env`` imports the integration against minimal stand-ins for the
+Home Assistant modules it uses. By default executor jobs run inline so tests
+stay deterministic; pass a ``concurrent.futures`` executor to run them in
+worker threads like Home Assistant does.
+"""
+
+import asyncio
+import sys
+import types
+import importlib.machinery
+import importlib.util
+from contextvars import ContextVar
+from datetime import datetime
+from importlib import import_module
+from pathlib import Path
+from unittest.mock import AsyncMock
+from zoneinfo import ZoneInfo
+
+
+def setup_env(tmp_path, executor=None):
+    original_modules = set(sys.modules.keys())
+    # Other test modules keep their own stubs of these packages around
+    replaced = {
+        name: sys.modules.pop(name)
+        for name in list(sys.modules)
+        if name.split(".")[0] in {"tally_list", "homeassistant", "voluptuous"}
+    }
+
+    # Stub the Home Assistant modules imported by the integration
+    ha = types.ModuleType("homeassistant")
+    components = types.ModuleType("homeassistant.components")
+    components.__path__ = []
+    sensor_comp = types.ModuleType("homeassistant.components.sensor")
+    button_comp = types.ModuleType("homeassistant.components.button")
+    ws_mod = types.ModuleType("homeassistant.components.websocket_api")
+
+    class SensorEntity:  # pragma: no cover - simple stub
+        def async_write_ha_state(self):
+            self.hass_writes = getattr(self, "hass_writes", 0) + 1
+
+    class ButtonEntity:  # pragma: no cover - simple stub
+        pass
+
+    sensor_comp.SensorEntity = SensorEntity
+    button_comp.ButtonEntity = ButtonEntity
+    ws_mod.websocket_command = lambda schema: (lambda func: func)
+    ws_mod.async_response = lambda func: func
+    ws_mod.async_register_command = lambda hass, handler: None
+    ws_mod.ActiveConnection = object
+    ws_mod.event_message = lambda msg_id, event: {"id": msg_id, "event": event}
+    components.sensor = sensor_comp
+    components.button = button_comp
+    components.websocket_api = ws_mod
+
+    helpers = types.ModuleType("homeassistant.helpers")
+    helpers.__path__ = []
+    event_mod = types.ModuleType("homeassistant.helpers.event")
+
+    class TrackStates:  # pragma: no cover - simple stub
+        def __init__(self, all_states, entities, domains):
+            self.domains = domains
+
+    event_mod.TrackStates = TrackStates
+    event_mod.async_track_state_change_filtered = lambda hass, track, action: None
+    event_mod.async_track_time_interval = lambda *args, **kwargs: None
+    event_mod.async_call_later = lambda *args, **kwargs: None
+    restore_mod = types.ModuleType("homeassistant.helpers.restore_state")
+
+    class RestoreEntity:  # pragma: no cover - simple stub
+        async def async_get_last_state(self):
+            return None
+
+    restore_mod.RestoreEntity = RestoreEntity
+    typing_mod = types.ModuleType("homeassistant.helpers.typing")
+    typing_mod.ConfigType = dict
+    storage_mod = types.ModuleType("homeassistant.helpers.storage")
+
+    class Store:  # pragma: no cover - simple stub
+        preload: dict = {}
+
+        def __init__(self, hass, version, key, private=False, **kwargs):
+            self.key = key
+            self.saved = None
+
+        async def async_load(self):
+            return self.preload.get(self.key)
+
+        async def async_save(self, data):
+            self.saved = data
+
+        def async_delay_save(self, data_func, delay=0):
+            self.saved = data_func()
+
+    storage_mod.Store = Store
+    er_mod = types.ModuleType("homeassistant.helpers.entity_registry")
+    selector_mod = types.ModuleType("homeassistant.helpers.selector")
+    selector_mod.IconSelector = object
+    http_mod = types.ModuleType("homeassistant.helpers.http")
+    http_mod.current_request = ContextVar("current_request", default=None)
+    for name, mod in {
+        "event": event_mod,
+        "restore_state": restore_mod,
+        "typing": typing_mod,
+        "storage": storage_mod,
+        "entity_registry": er_mod,
+        "selector": selector_mod,
+        "http": http_mod,
+    }.items():
+        setattr(helpers, name, mod)
+
+    util_mod = types.ModuleType("homeassistant.util")
+    util_mod.__path__ = []
+    util_mod.slugify = lambda value: value.lower().replace(" ", "_")
+    dt_mod = types.ModuleType("homeassistant.util.dt")
+    dt_mod.get_time_zone = ZoneInfo
+    dt_mod.now = lambda tz=None: datetime(2025, 9, 14, 20, 15, tzinfo=tz)
+    util_mod.dt = dt_mod
+
+    config_entries_mod = types.ModuleType("homeassistant.config_entries")
+
+    class ConfigFlow:  # pragma: no cover - simple stub
+        def __init_subclass__(cls, **kwargs):
+            pass
+
+    class OptionsFlow:  # pragma: no cover - simple stub
+        pass
+
+    config_entries_mod.ConfigEntry = object
+    config_entries_mod.ConfigFlow = ConfigFlow
+    config_entries_mod.OptionsFlow = OptionsFlow
+    config_entries_mod.SOURCE_IMPORT = "import"
+    ha_const_mod = types.ModuleType("homeassistant.const")
+    ha_const_mod.EVENT_HOMEASSISTANT_STOP = "homeassistant_stop"
+    core_mod = types.ModuleType("homeassistant.core")
+    core_mod.HomeAssistant = object
+    core_mod.callback = lambda func: func
+    exceptions_mod = types.ModuleType("homeassistant.exceptions")
+
+    class HomeAssistantError(Exception):  # pragma: no cover - simple stub
+        def __init__(self, *args, translation_domain=None, translation_key=None):
+            super().__init__(*args)
+            self.translation_key = translation_key
+
+    class Unauthorized(HomeAssistantError):  # pragma: no cover - simple stub
+        pass
+
+    exceptions_mod.HomeAssistantError = HomeAssistantError
+    exceptions_mod.Unauthorized = Unauthorized
+
+    vol_mod = types.ModuleType("voluptuous")
+
+    class Invalid(Exception):  # pragma: no cover - simple stub
+        pass
+
+    class Marker(str):  # pragma: no cover - simple stub
+        def __new__(cls, key, required, default=None):
+            marker = super().__new__(cls, key)
+            marker.required = required
+            marker.default = default
+            return marker
+
+    def _validate(validator, value):
+        if isinstance(validator, type):
+            if not isinstance(value, validator):
+                raise Invalid(f"expected {validator.__name__}")
+            return value
+        if isinstance(validator, list):
+            if not isinstance(value, list):
+                raise Invalid("expected a list")
+            return [_validate(validator[0], item) for item in value]
+        if isinstance(validator, dict):
+            return Schema(validator)(value)
+        return validator(value)
+
+    class Schema(dict):  # pragma: no cover - simple stub
+        def __init__(self, schema, *args, **kwargs):
+            super().__init__(schema)
+
+        def __call__(self, data):
+            if not isinstance(data, dict) or set(data) - set(self):
+                raise Invalid("invalid keys")
+            result = {}
+            for key, validator in self.items():
+                if key in data:
+                    result[str(key)] = _validate(validator, data[key])
+                elif getattr(key, "required", False):
+                    raise Invalid(f"required key {key}")
+                elif getattr(key, "default", None) is not None:
+                    result[str(key)] = key.default
+            return result
+
+    def _coerce(typ):
+        def _validator(value):
+            try:
+                return typ(value)
+            except (TypeError, ValueError) as err:
+                raise Invalid(str(err)) from err
+
+        return _validator
+
+    def _all(*validators):
+        def _validator(value):
+            for validator in validators:
+                value = _validate(validator, value)
+            return value
+
+        return _validator
+
+    def _range(min=None, max=None):
+        def _validator(value):
+            if (min is not None and value < min) or (max is not None and value > max):
+                raise Invalid("value out of range")
+            return value
+
+        return _validator
+
+    vol_mod.Invalid = Invalid
+    vol_mod.Schema = Schema
+    vol_mod.Required = lambda key, default=None: Marker(key, True, default)
+    vol_mod.Optional = lambda key, default=None: Marker(key, False, default)
+    vol_mod.Coerce = _coerce
+    vol_mod.All = _all
+    vol_mod.Range = _range
+    vol_mod.In = lambda values: values
+
+    sys.modules.update(
+        {
+            "homeassistant": ha,
+            "homeassistant.components": components,
+            "homeassistant.components.sensor": sensor_comp,
+            "homeassistant.components.button": button_comp,
+            "homeassistant.components.websocket_api": ws_mod,
+            "homeassistant.helpers": helpers,
+            "homeassistant.helpers.event": event_mod,
+            "homeassistant.helpers.restore_state": restore_mod,
+            "homeassistant.helpers.typing": typing_mod,
+            "homeassistant.helpers.storage": storage_mod,
+            "homeassistant.helpers.entity_registry": er_mod,
+            "homeassistant.helpers.selector": selector_mod,
+            "homeassistant.helpers.http": http_mod,
+            "homeassistant.util": util_mod,
+            "homeassistant.util.dt": dt_mod,
+            "homeassistant.config_entries": config_entries_mod,
+            "homeassistant.const": ha_const_mod,
+            "homeassistant.core": core_mod,
+            "homeassistant.exceptions": exceptions_mod,
+            "voluptuous": vol_mod,
+        }
+    )
+
+    component_path = Path(__file__).resolve().parents[1] / "custom_components" / "tally_list"
+    sys.path.append(str(component_path.parent))
+    spec = importlib.machinery.ModuleSpec(
+        name="tally_list",
+        loader=importlib.machinery.SourceFileLoader(
+            "tally_list", str(component_path / "__init__.py")
+        ),
+        is_package=True,
+    )
+    spec.submodule_search_locations = [str(component_path)]
+    spec.origin = str(component_path / "__init__.py")
+    integration = importlib.util.module_from_spec(spec)
+    sys.modules["tally_list"] = integration
+    spec.loader.exec_module(integration)
+    const = import_module("tally_list.const")
+    utils = import_module("tally_list.utils")
+
+    class DummyConfig:
+        language = "en"
+
+        def path(self, *parts):
+            return str(Path(tmp_path, *parts))
+
+    class DummyServices:
+        def __init__(self):
+            self.handlers = {}
+
+        def async_register(self, domain, service, handler, *args, **kwargs):
+            self.handlers[service] = handler
+
+    class DummyHass:
+        def __init__(self):
+            self.data = {}
+            self.config = DummyConfig()
+            self.services = DummyServices()
+            self.bus = types.SimpleNamespace(
+                async_fire=lambda *args, **kwargs: None,
+                async_listen_once=lambda *args, **kwargs: None,
+            )
+            self.states = types.SimpleNamespace(async_all=lambda domain=None: [])
+            self.auth = types.SimpleNamespace(
+                async_get_user=AsyncMock(return_value=None), current_user=None
+            )
+            self.config_entries = types.SimpleNamespace(
+                async_get_entry=lambda entry_id: None,
+                async_entries=lambda domain=None: [],
+            )
+            self.executor_jobs = []
+
+        @property
+        def loop(self):
+            return asyncio.get_running_loop()
+
+        def async_create_task(self, coro):
+            return asyncio.get_running_loop().create_task(coro)
+
+        async def async_add_executor_job(self, func, *args):
+            self.executor_jobs.append(func)
+            if executor is None:
+                return func(*args)
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, func, *args
+            )
+
+    def _cleanup():
+        sys.path.remove(str(component_path.parent))
+        for mod in set(sys.modules.keys()) - original_modules:
+            del sys.modules[mod]
+        sys.modules.update(replaced)
+
+    return DummyHass(), integration, const, utils, _cleanup
+
+
+def add_user(hass, const, utils, entry_id, user):
+    sensor_mod = import_module("tally_list.sensor")
+    entry = types.SimpleNamespace(entry_id=entry_id, data={const.CONF_USER: user})
+    data = {"entry": entry, "counts": {}, "credit": 0.0, "sensors": []}
+    hass.data[const.DOMAIN][entry_id] = data
+    utils.register_user_entry(hass, data)
+    for drink, price in hass.data[const.DOMAIN].get("drinks", {}).items():
+        data["sensors"].append(sensor_mod.TallyListSensor(hass, entry, drink, price))
+    data["sensors"].append(sensor_mod.TotalAmountSensor(hass, entry))
+    data["sensors"].append(sensor_mod.CreditSensor(hass, entry))
+    for sensor in data["sensors"]:
+        # Simulate the entity being added and writing its initial state.
+        sensor.hass = hass
+        sensor._async_write_tracked_state()
+        sensor.hass_writes = 0
+    return data
+
+
+def sensor_writes(data):
+    return {sensor._attr_unique_id: sensor.hass_writes for sensor in data["sensors"]}
+
+
+def service_call(data, user_id=None):
+    return types.SimpleNamespace(
+        data=data, context=types.SimpleNamespace(user_id=user_id)
+    )
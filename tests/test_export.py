@@ -0,0 +1,161 @@
+import gzip
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "custom_components" / "tally_list"))
+
+from export import (  # noqa: E402
+    MANIFEST_NAME,
+    backup_period_start,
+    cleanup_backups,
+    export_logs,
+    iter_export_rows,
+    iter_ndjson_lines,
+    retention_cutoff,
+    write_backup,
+)
+
+
+def test_backup_period_start_from_filename():
+    assert backup_period_start("amount_due_daily_2025-09-14_20-15.csv") == datetime(
+        2025, 9, 14, 20, 15
+    )
+    assert backup_period_start("amount_due_weekly_2025-01.csv") == datetime(
+        2024, 12, 30
+    )
+    assert backup_period_start("amount_due_monthly_2025-02.csv") == datetime(
+        2025, 2, 1
+    )
+    assert backup_period_start("notes.txt") is None
+    assert backup_period_start("amount_due_monthly_2025-13.csv") is None
+
+
+def test_retention_cutoff_is_calendar_exact():
+    now = datetime(2025, 3, 31, 12, 0)
+    assert retention_cutoff(now, 1, "months") == datetime(2025, 2, 1)
+    assert retention_cutoff(now, 3, "months") == datetime(2024, 12, 1)
+    assert retention_cutoff(now, 2, "weeks") == datetime(2025, 3, 17)
+    assert retention_cutoff(now, 7, "days") == datetime(2025, 3, 24)
+
+
+def test_cleanup_builds_manifest_and_removes_expired(tmp_path):
+    for month in range(1, 7):
+        (tmp_path / f"amount_due_monthly_2025-{month:02d}.csv").write_text("x")
+    (tmp_path / "keep_me.txt").write_text("x")
+
+    removed = cleanup_backups(str(tmp_path), 3, "months", datetime(2025, 6, 15))
+
+    assert removed == [
+        "amount_due_monthly_2025-01.csv",
+        "amount_due_monthly_2025-02.csv",
+    ]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        MANIFEST_NAME,
+        "amount_due_monthly_2025-03.csv",
+        "amount_due_monthly_2025-04.csv",
+        "amount_due_monthly_2025-05.csv",
+        "amount_due_monthly_2025-06.csv",
+        "keep_me.txt",
+    ]
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert [entry["file"] for entry in manifest][0] == "amount_due_monthly_2025-03.csv"
+
+
+def test_write_backup_records_manifest_and_keeps_newest_files(tmp_path):
+    created = datetime(2025, 9, 14, 20, 15)
+    for minute in (10, 5, 20):
+        path = tmp_path / f"amount_due_manual_2025-09-14_20-{minute:02d}.csv"
+        rows = iter_export_rows([("Alice", {"Bier": 1}, 0.0, 2.0)], ["Bier"], "€")
+        write_backup(str(path), rows, created)
+    assert path.read_text(encoding="utf-8").splitlines() == [
+        "Name,Betrag (€),Bier,Guthaben (€)",
+        "Alice,2.00,1,0.00",
+    ]
+
+    removed = cleanup_backups(str(tmp_path), 2, "files", created)
+
+    assert removed == ["amount_due_manual_2025-09-14_20-05.csv"]
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert [entry["file"] for entry in manifest] == [
+        "amount_due_manual_2025-09-14_20-10.csv",
+        "amount_due_manual_2025-09-14_20-20.csv",
+    ]
+    assert manifest[0]["created"] == created.isoformat()
+
+
+def test_export_logs_formats(tmp_path):
+    log_dir = tmp_path / "price_list"
+    log_dir.mkdir()
+    (log_dir / "price_list_2025.csv").write_text(
+        "Time;User;Action;Details\n"
+        "2025-09-14T20:15;Alice;add_drink;Alice:Bier+1\n"
+        "2025-09-14T20:16;Alice;add_drink;Bob:Limo+2\n"
+        "2025-09-14T20:17;Bob;add_credit;Bob:5.0\n",
+        encoding="utf-8",
+    )
+
+    assert export_logs(str(tmp_path), str(tmp_path / "logs"), "ndjson") == [
+        "price_list_2025.ndjson"
+    ]
+    lines = [
+        json.loads(line)
+        for line in (tmp_path / "logs" / "price_list_2025.ndjson")
+        .read_text(encoding="utf-8")
+        .splitlines()
+    ]
+    assert lines == [
+        {
+            "columns": ["Time", "User", "Action", "Details"],
+            "dictionary": ["User", "Action"],
+        },
+        {"d": 1, "v": "Alice"},
+        {"d": 2, "v": "add_drink"},
+        ["2025-09-14T20:15", 0, 0, "Alice:Bier+1"],
+        ["2025-09-14T20:16", 0, 0, "Bob:Limo+2"],
+        {"d": 1, "v": "Bob"},
+        {"d": 2, "v": "add_credit"},
+        ["2025-09-14T20:17", 1, 1, "Bob:5.0"],
+    ]
+    # Up-to-date exports are not rewritten.
+    assert export_logs(str(tmp_path), str(tmp_path / "logs"), "ndjson") == []
+
+    export_logs(str(tmp_path), str(tmp_path / "logs"), "csv_gz")
+    gz_path = tmp_path / "logs" / "price_list_2025.csv.gz"
+    with gzip.open(gz_path, "rt", encoding="utf-8") as file:
+        assert file.read().splitlines()[1] == (
+            "2025-09-14T20:15,Alice,add_drink,Alice:Bier+1"
+        )
+
+
+def test_export_logs_dictionary_encoding_shrinks_free_drink_log(tmp_path):
+    log_dir = tmp_path / "free_drinks"
+    log_dir.mkdir()
+    rows = [["Uhrzeit", "Name", "Getränke mit Anzahl", "Kommentar"]] + [
+        [
+            f"2025-09-14T20:{i % 60:02d}",
+            ("Alice", "Bob")[i % 2],
+            ("Bier x1", "Limo x2")[i % 2],
+            "",
+        ]
+        for i in range(200)
+    ]
+    (log_dir / "free_drinks_2025.csv").write_text(
+        "".join(";".join(row) + "\n" for row in rows), encoding="utf-8"
+    )
+
+    export_logs(str(tmp_path), str(tmp_path / "logs"), "ndjson")
+    encoded = (tmp_path / "logs" / "free_drinks_2025.ndjson").read_text(
+        encoding="utf-8"
+    )
+    lines = [json.loads(line) for line in encoded.splitlines()]
+    assert lines[0]["dictionary"] == ["Name", "Getränke mit Anzahl"]
+    assert lines[1:5] == [
+        {"d": 1, "v": "Alice"},
+        {"d": 2, "v": "Bier x1"},
+        ["2025-09-14T20:00", 0, 0, ""],
+        {"d": 1, "v": "Bob"},
+    ]
+    plain = "".join(iter_ndjson_lines(rows))
+    assert len(encoded.encode()) < 0.8 * len(plain.encode())
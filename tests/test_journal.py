@@ -0,0 +1,91 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "custom_components" / "tally_list"))
+
+from journal import LedgerJournal  # noqa: E402
+
+
+class DummyHass:
+    def __init__(self):
+        self.executor_jobs = 0
+
+    def async_create_task(self, coro):
+        return asyncio.get_running_loop().create_task(coro)
+
+    async def async_add_executor_job(self, func, *args):
+        self.executor_jobs += 1
+        return func(*args)
+
+
+class DummyStore:
+    def __init__(self):
+        self.saved = []
+
+    async def async_save(self, data):
+        self.saved.append(data)
+
+
+def _journal(tmp_path, users, threshold=500):
+    hass = DummyHass()
+    store = DummyStore()
+    journal = LedgerJournal(
+        hass,
+        str(tmp_path / "ledger.journal"),
+        store,
+        lambda: {"seq": journal.seq, "users": dict(users)},
+        compact_threshold=threshold,
+    )
+    return hass, store, journal
+
+
+@pytest.mark.asyncio
+async def test_records_are_batched_and_replayed(tmp_path):
+    users = {}
+    hass, store, journal = _journal(tmp_path, users)
+    journal.record("Alice", {"counts": {"Bier": 1}, "credit": 0.0})
+    journal.record("Alice", {"counts": {"Bier": 2}, "credit": 0.0})
+    journal.record("Bob", {"counts": {"Limo": 1}, "credit": 5.0})
+    await journal.async_flush()
+    assert hass.executor_jobs == 1
+    lines = (tmp_path / "ledger.journal").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["seq"] for line in lines] == [1, 2, 3]
+
+    # Simulate a restart where the snapshot only contains the first record
+    # and the last line was torn by a power cut.
+    with open(tmp_path / "ledger.journal", "a", encoding="utf-8") as file:
+        file.write('{"seq": 4, "user": "Bo')
+    restored = {"Alice": {"counts": {"Bier": 1}, "credit": 0.0}}
+    _, store, journal = _journal(tmp_path, restored)
+    assert await journal.async_replay(restored, 1) == 2
+    assert restored == {
+        "Alice": {"counts": {"Bier": 2}, "credit": 0.0},
+        "Bob": {"counts": {"Limo": 1}, "credit": 5.0},
+    }
+    assert journal.seq == 3
+    assert store.saved[-1]["seq"] == 3
+    assert (tmp_path / "ledger.journal").read_text(encoding="utf-8") == ""
+
+
+@pytest.mark.asyncio
+async def test_journal_compacts_after_threshold(tmp_path):
+    users = {}
+    hass, store, journal = _journal(tmp_path, users, threshold=3)
+    for count in range(1, 4):
+        users["Alice"] = {"counts": {"Bier": count}, "credit": 0.0}
+        journal.record("Alice", users["Alice"])
+        await journal.async_flush()
+    assert store.saved == [
+        {"seq": 3, "users": {"Alice": {"counts": {"Bier": 3}, "credit": 0.0}}}
+    ]
+    assert (tmp_path / "ledger.journal").read_text(encoding="utf-8") == ""
+
+    journal.record("Alice", None)
+    await journal.async_flush()
+    _, _, replay = _journal(tmp_path, users)
+    assert await replay.async_replay(users, 3) == 1
+    assert users == {}
@@ -0,0 +1,82 @@
+import random
+import sys
+import types
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "custom_components" / "tally_list"))
+
+from const import DOMAIN, CONF_CASH_USER_NAME, CONF_USER  # noqa: E402
+from ledger import (  # noqa: E402
+    add_count,
+    amount_due,
+    refresh_totals,
+    reset_entry,
+    set_count,
+    set_credit,
+)
+from utils import register_user_entry  # noqa: E402
+
+
+def _expected(hass, data):
+    domain = hass.data[DOMAIN]
+    total = sum(
+        data["counts"].get(drink, 0) * price for drink, price in domain["drinks"].items()
+    )
+    user = data["entry"].data[CONF_USER]
+    if user.lower() != domain[CONF_CASH_USER_NAME].lower():
+        total = max(total - domain["free_amount"], 0.0)
+    return round(total - data.get("credit", 0.0), 2)
+
+
+def _setup(users):
+    hass = types.SimpleNamespace(
+        data={
+            DOMAIN: {
+                "drinks": {"Bier": 2.0, "Limo": 1.5},
+                "free_amount": 1.0,
+                CONF_CASH_USER_NAME: "Cash",
+            }
+        }
+    )
+    entries = []
+    for user in users:
+        entry = types.SimpleNamespace(entry_id=user, data={CONF_USER: user})
+        data = {"entry": entry, "counts": {}, "credit": 0.0}
+        hass.data[DOMAIN][user] = data
+        register_user_entry(hass, data)
+        entries.append(data)
+    return hass, entries
+
+
+def test_running_total_matches_recomputation():
+    hass, (alice, cash) = _setup(["Alice", "Cash"])
+    assert amount_due(hass, alice) == 0.0
+    assert amount_due(hass, cash) == 0.0
+    rng = random.Random(1)
+    for _ in range(200):
+        data = rng.choice([alice, cash])
+        drink = rng.choice(["Bier", "Limo"])
+        op = rng.random()
+        if op < 0.6:
+            add_count(hass, data, drink, rng.randint(1, 3))
+        elif op < 0.8:
+            set_count(hass, data, drink, rng.randint(0, 5))
+        else:
+            set_credit(hass, data, rng.choice([0.0, 2.5, -1.0]))
+        assert data["amount_due"] == _expected(hass, data)
+    reset_entry(hass, alice, ["Bier", "Limo"])
+    assert alice["amount_due"] == 0.0
+
+
+def test_refresh_totals_after_price_change():
+    hass, (alice, bob) = _setup(["Alice", "Bob"])
+    add_count(hass, alice, "Bier", 3)
+    add_count(hass, bob, "Limo", 2)
+    assert amount_due(hass, alice) == 5.0
+    assert amount_due(hass, bob) == 2.0
+
+    hass.data[DOMAIN]["drinks"] = {"Bier": 3.0, "Limo": 1.5}
+    hass.data[DOMAIN]["free_amount"] = 0.0
+    refresh_totals(hass)
+    assert alice["amount_due"] == 9.0
+    assert bob["amount_due"] == 3.0
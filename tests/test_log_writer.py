@@ -0,0 +1,51 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "custom_components" / "tally_list"))
+
+from log_writer import LogWriter  # noqa: E402
+
+
+class DummyHass:
+    def __init__(self):
+        self.executor_jobs = 0
+
+    @property
+    def loop(self):
+        return asyncio.get_running_loop()
+
+    def async_create_task(self, coro):
+        return asyncio.get_running_loop().create_task(coro)
+
+    async def async_add_executor_job(self, func, *args):
+        self.executor_jobs += 1
+        return func(*args)
+
+
+@pytest.mark.asyncio
+async def test_bad_row_does_not_drop_batch():
+    hass = DummyHass()
+    writer = LogWriter(hass)
+    written = []
+    refreshed = []
+
+    def _good(value):
+        written.append(value)
+
+    def _bad(value):
+        raise ValueError(f"broken row {value}")
+
+    async def _refresh(hass):
+        refreshed.append(hass)
+
+    writer.queue(_good, 1, refresh=_refresh)
+    writer.queue(_bad, 2, refresh=_refresh)
+    writer.queue(_good, 3, refresh=_refresh)
+    await writer.async_flush()
+
+    assert written == [1, 3]
+    assert refreshed == [hass]
+    assert hass.executor_jobs == 1
@@ -1,115 +1,25 @@
-import sys
 import types
 import csv
 from pathlib import Path
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from unittest.mock import patch, AsyncMock
-import importlib.machinery
 from importlib import import_module
 import pytest
 
+from ha_env import setup_env
+
 
 def _setup_env(tmp_path):
-    original_modules = set(sys.modules.keys())
-
-    # Stub minimal Home Assistant and related modules
-    ha = types.ModuleType("homeassistant")
-    helpers = types.ModuleType("homeassistant.helpers")
-    helpers.__path__ = []
-    er_mod = types.ModuleType("homeassistant.helpers.entity_registry")
-    helpers.entity_registry = er_mod
-    selector_mod = types.ModuleType("homeassistant.helpers.selector")
-    class IconSelector:  # pragma: no cover - simple stub
-        pass
-    selector_mod.IconSelector = IconSelector
-    helpers.selector = selector_mod
-    util_mod = types.ModuleType("homeassistant.util")
-    utile_dt_mod = types.ModuleType("homeassistant.util.dt")
-    utile_dt_mod.get_time_zone = ZoneInfo
-    utile_dt_mod.now = datetime.now
-    util_mod.dt = utile_dt_mod
-    http_mod = types.ModuleType("homeassistant.helpers.http")
-    from contextvars import ContextVar
-    http_mod.current_request = ContextVar("current_request", default=None)
-    helpers.http = http_mod
-    config_entries_mod = types.ModuleType("homeassistant.config_entries")
-    class ConfigFlow:  # pragma: no cover - simple stub
-        def __init_subclass__(cls, **kwargs):
-            pass
-    class OptionsFlow:  # pragma: no cover - simple stub
-        def __init_subclass__(cls, **kwargs):
-            pass
-    config_entries_mod.ConfigFlow = ConfigFlow
-    config_entries_mod.OptionsFlow = OptionsFlow
-    config_entries_mod.SOURCE_IMPORT = "import"
-    core_mod = types.ModuleType("homeassistant.core")
-    def callback(func):  # pragma: no cover - simple stub
-        return func
-    core_mod.callback = callback
-    vol_mod = types.ModuleType("voluptuous")
-    vol_mod.Schema = lambda schema, *args, **kwargs: schema
-    vol_mod.Required = lambda key, default=None: key
-    vol_mod.Optional = lambda key, default=None: key
-    vol_mod.Coerce = lambda typ: typ
-    sys.modules.update({
-        "homeassistant": ha,
-        "homeassistant.helpers": helpers,
-        "homeassistant.helpers.entity_registry": er_mod,
-        "homeassistant.helpers.selector": selector_mod,
-        "homeassistant.helpers.http": http_mod,
-        "homeassistant.util": util_mod,
-        "homeassistant.util.dt": utile_dt_mod,
-        "homeassistant.config_entries": config_entries_mod,
-        "homeassistant.core": core_mod,
-        "voluptuous": vol_mod,
-    })
-
-    # Prepare dummy tally_list package and stub sensor
-    component_path = Path(__file__).resolve().parents[1] / "custom_components" / "tally_list"
-    sys.path.append(str(component_path.parent))
-    pkg = types.ModuleType("tally_list")
-    pkg.__path__ = [str(component_path)]
-    pkg.__spec__ = importlib.machinery.ModuleSpec(name="tally_list", loader=None, is_package=True)
-    sys.modules["tally_list"] = pkg
-    sensor_stub = types.ModuleType("tally_list.sensor")
-    class PriceListFeedSensor:  # pragma: no cover - simple stub
-        pass
-    sensor_stub.PriceListFeedSensor = PriceListFeedSensor
-    sys.modules["tally_list.sensor"] = sensor_stub
-
-    # Import module under test
+    hass, _integration, const_mod, _utils, cleanup = setup_env(tmp_path)
     config_flow = import_module("tally_list.config_flow")
-    const_mod = import_module("tally_list.const")
-    _write_price_list_log = config_flow._write_price_list_log
-    _log_price_change = config_flow._log_price_change
-    OptionsFlowHandler = config_flow.TallyListOptionsFlowHandler
-
-    class DummyConfig:
-        def __init__(self, base_path):
-            self._base_path = base_path
-
-        def path(self, *parts):
-            return str(Path(self._base_path, *parts))
-
-    class DummyHass:
-        def __init__(self, base_path):
-            self.config = DummyConfig(base_path)
-
-    hass = DummyHass(tmp_path)
-
-    def _cleanup():
-        sys.path.remove(str(component_path.parent))
-        for mod in set(sys.modules.keys()) - original_modules:
-            del sys.modules[mod]
-
     return (
         hass,
-        _write_price_list_log,
-        _log_price_change,
-        OptionsFlowHandler,
+        config_flow._write_price_list_log,
+        config_flow._log_price_change,
+        config_flow.TallyListOptionsFlowHandler,
         const_mod,
-        _cleanup,
+        cleanup,
     )
 
 
@@ -258,6 +168,31 @@ def test_free_drink_logged_separately(tmp_path):
         cleanup()
 
 
+def test_large_log_only_tail_rewritten(tmp_path):
+    hass, _write_price_list_log, _, _, _, cleanup = _setup_env(tmp_path)
+    try:
+        path = Path(tmp_path, "tally_list", "price_list", "price_list_2025.csv")
+        path.parent.mkdir(parents=True)
+        lines = ["Time;User;Action;Details"] + [
+            f"2025-01-01T10:{i % 60:02d};Alice;add_drink;Alice:Bier+1"
+            for i in range(20000)
+        ]
+        existing = ("\r\n".join(lines) + "\r\n").encode("utf-8")
+        path.write_bytes(existing)
+        tz = ZoneInfo("Europe/Berlin")
+        ts = datetime(2025, 9, 14, 1, 9, 30, tzinfo=tz)
+        with patch("tally_list.config_flow.dt_util.now", return_value=ts):
+            _write_price_list_log(hass, "Bob", "add_drink", "Bob:Bier+1")
+            _write_price_list_log(hass, "Bob", "add_drink", "Bob:Limo+1")
+        content = path.read_bytes()
+        assert content.startswith(existing)
+        assert content[len(existing):].decode("utf-8") == (
+            "2025-09-14T01:09;Bob;add_drink;Bob:Bier+1,Limo+1\r\n"
+        )
+    finally:
+        cleanup()
+
+
 @pytest.mark.asyncio
 async def test_log_when_price_changed(tmp_path):
     hass, _, _, OptionsFlowHandler, const, cleanup = _setup_env(tmp_path)
@@ -0,0 +1,107 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "custom_components" / "tally_list"))
+
+from security import (  # noqa: E402
+    PinVerificationCache,
+    async_hash_pin,
+    async_verify_pin,
+    hash_pin,
+    verify_pin,
+)
+
+
+class DummyHass:
+    def __init__(self, loop):
+        self._loop = loop
+
+    def async_add_executor_job(self, func, *args):
+        return self._loop.run_in_executor(None, func, *args)
+
+
+def test_verify_pin_roundtrip():
+    stored = hash_pin("1234")
+    assert verify_pin("1234", stored)
+    assert not verify_pin("4321", stored)
+
+
+def test_verify_pin_rejects_malformed_hash():
+    assert not verify_pin("1234", "plain")
+    assert not verify_pin("1234", "md5$1$00$00")
+    assert not verify_pin("1234", "pbkdf2_sha256$x$00$00")
+
+
+@pytest.mark.asyncio
+async def test_async_pin_helpers_roundtrip():
+    hass = DummyHass(asyncio.get_running_loop())
+    stored = await async_hash_pin(hass, "1234")
+    assert await async_verify_pin(hass, "1234", stored)
+    assert not await async_verify_pin(hass, "0000", stored)
+
+
+@pytest.mark.asyncio
+async def test_pin_helpers_run_in_executor():
+    hass = DummyHass(asyncio.get_running_loop())
+    with patch.object(
+        hass, "async_add_executor_job", wraps=hass.async_add_executor_job
+    ) as executor_job:
+        stored = await async_hash_pin(hass, "1234")
+        assert await async_verify_pin(hass, "1234", stored)
+    # Loop latency under concurrent checks is measured in bench_hot_paths.py.
+    assert [call.args[:2] for call in executor_job.call_args_list] == [
+        (hash_pin, "1234"),
+        (verify_pin, "1234"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pin_cache_skips_repeated_derivation():
+    calls = []
+    loop = asyncio.get_running_loop()
+
+    class CountingHass(DummyHass):
+        def async_add_executor_job(self, func, *args):
+            calls.append(func)
+            return super().async_add_executor_job(func, *args)
+
+    hass = CountingHass(loop)
+    cache = PinVerificationCache()
+    stored = hash_pin("1234")
+    assert await cache.async_verify(hass, "tablet", "Alice", "1234", stored)
+    assert await cache.async_verify(hass, "tablet", "Alice", "1234", stored)
+    assert len(calls) == 1
+    assert not await cache.async_verify(hass, "tablet", "Alice", "0000", stored)
+    assert not cache.contains("tablet", "Alice", "0000", stored)
+    assert not cache.contains("tablet", "Bob", "1234", stored)
+    assert not cache.contains("tablet", "Alice", "1234", hash_pin("1234"))
+
+
+def test_pin_cache_expires_and_evicts():
+    cache = PinVerificationCache(ttl=60, max_size=2)
+    cache.add("tablet", "Alice", "1111", "h1")
+    cache.add("tablet", "Bob", "2222", "h2")
+    assert cache.contains("tablet", "Alice", "1111", "h1")
+    cache.add("tablet", "Carol", "3333", "h3")
+    assert len(cache) == 2
+    assert not cache.contains("tablet", "Bob", "2222", "h2")
+    assert cache.contains("tablet", "Alice", "1111", "h1")
+
+    with patch("security.time.monotonic", return_value=time.monotonic() + 61):
+        assert not cache.contains("tablet", "Alice", "1111", "h1")
+
+
+def test_pin_cache_invalidate_user():
+    cache = PinVerificationCache()
+    cache.add("tablet", "Alice", "1111", "h1")
+    cache.add("tablet", "Bob", "2222", "h2")
+    cache.invalidate("Alice")
+    assert not cache.contains("tablet", "Alice", "1111", "h1")
+    assert cache.contains("tablet", "Bob", "2222", "h2")
+    cache.invalidate()
+    assert len(cache) == 0
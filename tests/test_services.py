@@ -0,0 +1,676 @@
+import asyncio
+import json
+import random
+import sys
+import types
+from datetime import datetime
+from importlib import import_module
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from ha_env import add_user, sensor_writes, service_call, setup_env
+
+
+@pytest.mark.asyncio
+async def test_add_drinks_batch_books_all_items_once(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0, "Limo": 1.5}
+        alice = add_user(hass, const, utils, "a", "Alice")
+        bob = add_user(hass, const, utils, "b", "Bob")
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINKS_BATCH]
+
+        await handler(
+            service_call(
+                {
+                    const.ATTR_ITEMS: [
+                        {"user": "Alice", "drink": "Bier", "count": 2},
+                        {"user": "Bob", "drink": "Limo"},
+                        {"user": "Alice", "drink": "Limo"},
+                        {"user": "Alice", "drink": "Bier"},
+                    ]
+                }
+            )
+        )
+
+        assert alice["counts"] == {"Bier": 3, "Limo": 1}
+        assert bob["counts"] == {"Limo": 1}
+        await asyncio.sleep(0)
+        # One write per changed sensor, nothing for untouched ones.
+        assert sensor_writes(alice) == {
+            "a_Bier_count": 1,
+            "a_Limo_count": 1,
+            "a_amount_due": 1,
+            "a_credit": 0,
+        }
+        assert sensor_writes(bob) == {
+            "b_Limo_count": 1,
+            "b_amount_due": 1,
+            "b_Bier_count": 0,
+            "b_credit": 0,
+        }
+        await hass.data[const.DOMAIN]["log_writer"].async_flush()
+        path = Path(tmp_path, "tally_list", "price_list", "price_list_2025.csv")
+        lines = path.read_text(encoding="utf-8").splitlines()
+        assert lines[1] == (
+            "2025-09-14T20:15;Unknown;add_drink;Alice:Bier+3,Bob:Limo+1,Alice:Limo+1"
+        )
+        assert len(lines) == 2
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_add_drinks_batch_is_atomic(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        hass.executor_jobs.clear()
+        alice = add_user(hass, const, utils, "a", "Alice")
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINKS_BATCH]
+
+        exceptions = sys.modules["homeassistant.exceptions"]
+        with pytest.raises(exceptions.HomeAssistantError) as err:
+            await handler(
+                service_call(
+                    {
+                        const.ATTR_ITEMS: [
+                            {"user": "Alice", "drink": "Bier"},
+                            {"user": "Nobody", "drink": "Bier"},
+                        ]
+                    }
+                )
+            )
+        assert err.value.translation_key == "user_unknown"
+        assert alice["counts"] == {}
+        assert hass.executor_jobs == []
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_add_drinks_batch_validates_items_like_websocket(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        alice = add_user(hass, const, utils, "a", "Alice")
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINKS_BATCH]
+        websocket = import_module("tally_list.websocket")
+
+        exceptions = sys.modules["homeassistant.exceptions"]
+        items = [
+            {"user": "Alice", "drink": "Bier"},
+            {"user": "Alice", "drink": "Bier", "count": 0},
+        ]
+        with pytest.raises(exceptions.HomeAssistantError) as err:
+            await handler(service_call({const.ATTR_ITEMS: items}))
+        assert err.value.translation_key == "invalid_booking"
+        assert alice["counts"] == {}
+        with pytest.raises(sys.modules["voluptuous"].Invalid):
+            websocket.BATCH_ITEM_SCHEMA(items[1])
+
+        await handler(
+            service_call(
+                {const.ATTR_ITEMS: [{"user": "Alice", "drink": "Bier", "count": "2"}]}
+            )
+        )
+        assert alice["counts"] == {"Bier": 2}
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_add_drink_service_single_booking(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        alice = add_user(hass, const, utils, "a", "Alice")
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINK]
+
+        await handler(service_call({"user": "Alice", "drink": "Bier", "count": 2}))
+
+        assert alice["counts"] == {"Bier": 2}
+        await hass.data[const.DOMAIN]["log_writer"].async_flush()
+        path = Path(tmp_path, "tally_list", "price_list", "price_list_2025.csv")
+        lines = path.read_text(encoding="utf-8").splitlines()
+        assert lines[1] == "2025-09-14T20:15;Unknown;add_drink;Alice:Bier+2"
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_logs_are_written_in_one_batch(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        hass.data[const.DOMAIN][const.CONF_ENABLE_FREE_DRINKS] = True
+        add_user(hass, const, utils, "a", "Alice")
+        cash_name = hass.data[const.DOMAIN][const.CONF_CASH_USER_NAME]
+        add_user(hass, const, utils, "cash", cash_name)
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINK]
+        hass.executor_jobs.clear()
+
+        await handler(service_call({"user": "Alice", "drink": "Bier"}))
+        await handler(
+            service_call(
+                {
+                    "user": "Alice",
+                    "drink": "Bier",
+                    const.ATTR_FREE_DRINK: True,
+                    const.ATTR_COMMENT: "Geburtstag",
+                }
+            )
+        )
+        await handler(service_call({"user": "Alice", "drink": "Bier"}))
+        base = Path(tmp_path, "tally_list")
+        assert not base.exists()
+
+        # Rows keep the minute they were booked in, not the flush time.
+        dt_mod = sys.modules["homeassistant.util.dt"]
+        dt_mod.now = lambda tz=None: datetime(2025, 9, 14, 20, 17, tzinfo=tz)
+        await hass.data[const.DOMAIN]["log_writer"].async_flush()
+
+        writer_cls = type(hass.data[const.DOMAIN]["log_writer"])
+        assert hass.executor_jobs.count(writer_cls._write) == 1
+        price_lines = (
+            (base / "price_list" / "price_list_2025.csv")
+            .read_text(encoding="utf-8")
+            .splitlines()
+        )
+        assert price_lines[1:] == [
+            "2025-09-14T20:15;Unknown;add_drink;Alice:Bier+1",
+            "2025-09-14T20:15;Unknown;add_free_drink;Alice:Bier+1",
+            "2025-09-14T20:15;Unknown;add_drink;Alice:Bier+1",
+        ]
+        free_lines = (
+            (base / "free_drinks" / "free_drinks_2025.csv")
+            .read_text(encoding="utf-8")
+            .splitlines()
+        )
+        assert free_lines[1:] == ["2025-09-14T20:15;Alice;Bier x1;Geburtstag"]
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_sensor_writes_coalesced_within_tick(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0, "Limo": 1.5}
+        alice = add_user(hass, const, utils, "a", "Alice")
+        add = hass.services.handlers[const.SERVICE_ADD_DRINK]
+        set_drink = hass.services.handlers[const.SERVICE_SET_DRINK]
+
+        sensor_mod = import_module("tally_list.sensor")
+        ledger = import_module("tally_list.ledger")
+        ledger.set_count(hass, alice, "Bier", 1)
+        sensor_mod.async_schedule_sensor_updates(hass, alice["sensors"])
+        ledger.set_count(hass, alice, "Bier", 2)
+        sensor_mod.async_schedule_sensor_updates(hass, alice["sensors"])
+        await asyncio.sleep(0)
+        assert sensor_writes(alice)["a_Bier_count"] == 1
+        assert sensor_writes(alice)["a_amount_due"] == 1
+
+        # Setting a count to its current value does not write anything.
+        await set_drink(service_call({"user": "Alice", "drink": "Bier", "count": 2}))
+        await asyncio.sleep(0)
+        assert sensor_writes(alice) == {
+            "a_Bier_count": 1,
+            "a_Limo_count": 0,
+            "a_amount_due": 1,
+            "a_credit": 0,
+        }
+
+        await add(service_call({"user": "Alice", "drink": "Limo"}))
+        await asyncio.sleep(0)
+        assert sensor_writes(alice)["a_Limo_count"] == 1
+        assert sensor_writes(alice)["a_Bier_count"] == 1
+        assert sensor_writes(alice)["a_amount_due"] == 2
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tablets_are_linearized_per_user(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        users = ["Alice", "Bob", "Carol", "Dave"]
+        entries = {
+            user: add_user(hass, const, utils, user.lower(), user) for user in users
+        }
+        rng = random.Random(1)
+        active: set[str] = set()
+        calls: dict[str, int] = {}
+        peak = 0
+
+        async def _get_user(user_id):
+            # Each service resolves the caller twice: when checking
+            # permissions before taking the lock, and when logging under it.
+            nonlocal peak
+            user = user_id.split("/")[0]
+            calls[user_id] = calls.get(user_id, 0) + 1
+            if calls[user_id] == 1:
+                return None
+            assert user not in active
+            active.add(user)
+            peak = max(peak, len(active))
+            await asyncio.sleep(rng.random() / 1000)
+            active.discard(user)
+            return None
+
+        hass.auth.async_get_user = _get_user
+        services = hass.services.handlers
+        # Same-user operations start in creation order and are linearized,
+        # so a sequential model gives the exact final state.
+        counts = {user: 0 for user in users}
+        credits = {user: 0.0 for user in users}
+        jobs = []
+        for i in range(200):
+            user = rng.choice(users)
+            roll = rng.random()
+            if roll < 0.5:
+                call = service_call({"user": user, "drink": "Bier"}, f"{user}/{i}")
+                counts[user] += 1
+                jobs.append(services[const.SERVICE_ADD_DRINK](call))
+            elif roll < 0.75:
+                call = service_call({"user": user, "drink": "Bier"}, f"{user}/{i}")
+                counts[user] = max(counts[user] - 1, 0)
+                jobs.append(services[const.SERVICE_REMOVE_DRINK](call))
+            else:
+                amount = rng.choice([0.5, 1.0, 2.5])
+                call = service_call(
+                    {"user": user, const.ATTR_AMOUNT: amount}, f"{user}/{i}"
+                )
+                if roll < 0.9:
+                    credits[user] += amount
+                    jobs.append(services[const.SERVICE_ADD_CREDIT](call))
+                else:
+                    credits[user] -= amount
+                    jobs.append(services[const.SERVICE_REMOVE_CREDIT](call))
+        await asyncio.gather(*jobs)
+
+        assert not active
+        assert peak > 1
+        for user, data in entries.items():
+            assert data["counts"].get("Bier", 0) == counts[user]
+            assert data["credit"] == pytest.approx(credits[user])
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_rejected_calls_take_no_locks(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        alice = add_user(hass, const, utils, "a", "Alice")
+        add_user(hass, const, utils, "b", "Bob")
+        hass.data[const.DOMAIN][utils.PERSON_CACHE_KEY] = {"bob-id": "Bob"}
+        utils.invalidate_permissions(hass)
+        locks = import_module("tally_list.locks")
+        exceptions = sys.modules["homeassistant.exceptions"]
+        reset = hass.services.handlers[const.SERVICE_RESET_COUNTERS]
+
+        async with locks.async_lock_users(hass, ["Alice"]):
+            # Resetting everyone is rejected without waiting for Alice.
+            with pytest.raises(exceptions.Unauthorized):
+                await asyncio.wait_for(reset(service_call({}, "bob-id")), 1)
+            assert not locks.user_lock(hass, "Bob").locked()
+        assert alice["counts"] == {}
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_bookings_wait_for_price_list_changes(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        alice = add_user(hass, const, utils, "a", "Alice")
+        locks = import_module("tally_list.locks")
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINK]
+
+        async with locks.async_lock_price_list(hass):
+            booking = asyncio.ensure_future(
+                handler(service_call({"user": "Alice", "drink": "Bier"}))
+            )
+            await asyncio.sleep(0.01)
+            assert alice["counts"] == {}
+            hass.data[const.DOMAIN]["drinks"] = {"Bier": 3.0}
+        await booking
+
+        assert alice["counts"] == {"Bier": 1}
+        assert alice["amount_due"] == 3.0
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_ledger_store_roundtrip(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        storage = sys.modules["homeassistant.helpers.storage"]
+        storage.Store.preload = {
+            "tally_list_ledger": {
+                "users": {"Bob": {"counts": {"Bier": 4}, "credit": 1.5}}
+            }
+        }
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        alice = add_user(hass, const, utils, "a", "Alice")
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINK]
+
+        await handler(service_call({"user": "Alice", "drink": "Bier", "count": 2}))
+
+        store = hass.data[const.DOMAIN]["ledger_store"]
+        assert store.saved == {
+            "seq": 1,
+            "users": {
+                "Bob": {"counts": {"Bier": 4}, "credit": 1.5},
+                "Alice": {"counts": {"Bier": 2}, "credit": 0.0},
+            }
+        }
+        ledger = import_module("tally_list.ledger")
+        entry = types.SimpleNamespace(entry_id="b", data={const.CONF_USER: "Bob"})
+        bob = {"entry": entry, "counts": {}, "credit": 0.0}
+        assert ledger.load_entry(hass, bob)
+        assert bob["counts"] == {"Bier": 4}
+        assert bob["credit"] == 1.5
+        assert bob["stored"] is True
+        assert alice["counts"] == {"Bier": 2}
+
+        await hass.data[const.DOMAIN]["ledger_journal"].async_flush()
+        journal_path = Path(tmp_path, ".storage", "tally_list_ledger.journal")
+        assert json.loads(journal_path.read_text(encoding="utf-8")) == {
+            "seq": 1,
+            "user": "Alice",
+            "counts": {"Bier": 2},
+            "credit": 0.0,
+        }
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_export_csv_reads_ledger(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0, "Limo": 1.5}
+        hass.data[const.DOMAIN]["free_amount"] = 1.0
+        bob = add_user(hass, const, utils, "b", "bob")
+        alice = add_user(hass, const, utils, "a", "Alice")
+        add_user(hass, const, utils, "p", "Preisliste")
+        ledger = import_module("tally_list.ledger")
+        ledger.set_count(hass, alice, "Bier", 3)
+        ledger.set_count(hass, bob, "Limo", 2)
+        ledger.set_credit(hass, bob, 0.5)
+        handler = hass.services.handlers[const.SERVICE_EXPORT_CSV]
+
+        await handler(service_call({"backup": "manual"}))
+
+        path = Path(
+            tmp_path, "tally_list", "manual", "amount_due_manual_2025-09-14_20-15.csv"
+        )
+        assert path.read_text(encoding="utf-8").splitlines() == [
+            "Name,Betrag (€),Bier,Limo,Guthaben (€)",
+            "Alice,5.00,3,0,0.00",
+            "bob,1.50,0,2,0.50",
+        ]
+    finally:
+        cleanup()
+
+
+class DummyConnection:
+    def __init__(self):
+        self.user = types.SimpleNamespace(id="admin")
+        self.subscriptions = {}
+        self.results = []
+        self.messages = []
+
+    def send_result(self, msg_id, result=None):
+        self.results.append((msg_id, result))
+
+    def send_message(self, message):
+        self.messages.append(message)
+
+
+@pytest.mark.asyncio
+async def test_subscribe_sends_snapshot_and_coalesced_deltas(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0, "Limo": 1.5}
+        alice = add_user(hass, const, utils, "a", "Alice")
+        add_user(hass, const, utils, "b", "Bob")
+        websocket = import_module("tally_list.websocket")
+        connection = DummyConnection()
+
+        websocket.websocket_subscribe(hass, connection, {"id": 7})
+
+        assert connection.results == [(7, None)]
+        assert connection.messages[0]["event"]["snapshot"]["users"][0] == {
+            "user": "Alice",
+            "counts": {},
+            "credit": 0.0,
+            "total": 0.0,
+        }
+
+        handler = hass.services.handlers[const.SERVICE_ADD_DRINKS_BATCH]
+        await handler(
+            service_call(
+                {
+                    const.ATTR_ITEMS: [
+                        {"user": "Alice", "drink": "Bier"},
+                        {"user": "Alice", "drink": "Limo", "count": 2},
+                    ]
+                }
+            )
+        )
+        await asyncio.sleep(0)
+
+        assert connection.messages[1:] == [
+            {
+                "id": 7,
+                "event": {
+                    "changes": [
+                        {
+                            "user": "Alice",
+                            "counts": {"Bier": 1, "Limo": 2},
+                            "credit": 0.0,
+                            "total": 5.0,
+                        }
+                    ]
+                },
+            }
+        ]
+
+        connection.subscriptions[7]()
+        ledger = import_module("tally_list.ledger")
+        ledger.set_count(hass, alice, "Bier", 5)
+        await asyncio.sleep(0)
+        assert len(connection.messages) == 2
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_get_snapshot_is_cached_until_ledger_changes(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0, "Limo": 1.5}
+        add_user(hass, const, utils, "b", "Bob")
+        alice = add_user(hass, const, utils, "a", "Alice")
+        websocket = import_module("tally_list.websocket")
+        ledger = import_module("tally_list.ledger")
+        ledger.set_count(hass, alice, "Limo", 2)
+        ledger.set_credit(hass, alice, 1.0)
+        connection = DummyConnection()
+
+        await websocket.websocket_get_snapshot(hass, connection, {"id": 1})
+        await websocket.websocket_get_snapshot(hass, connection, {"id": 2})
+
+        first = connection.results[0][1]
+        assert first == {
+            "drinks": ["Bier", "Limo"],
+            "prices": [2.0, 1.5],
+            "users": ["Alice", "Bob"],
+            "counts": [[0, 2], [0, 0]],
+            "credits": [1.0, 0.0],
+            "totals": [2.0, 0.0],
+        }
+        assert connection.results[1][1] is first
+
+        ledger.add_count(hass, alice, "Bier", 1)
+        await websocket.websocket_get_snapshot(hass, connection, {"id": 3})
+        updated = connection.results[2][1]
+        assert updated is not first
+        assert updated["counts"][0] == [1, 2]
+        assert updated["totals"][0] == 4.0
+
+        add_user(hass, const, utils, "c", "Carol")
+        await websocket.websocket_get_snapshot(hass, connection, {"id": 4})
+        assert connection.results[3][1]["users"] == ["Alice", "Bob", "Carol"]
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_totals_follow_price_list_entry_set_up_last(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        ledger = import_module("tally_list.ledger")
+        hass.config_entries.async_update_entry = MagicMock()
+        hass.config_entries.async_forward_entry_setups = AsyncMock()
+        entry = types.SimpleNamespace(
+            entry_id="a", version=2, data={const.CONF_USER: "Alice"}
+        )
+        assert await integration.async_setup_entry(hass, entry)
+        alice = hass.data[const.DOMAIN]["a"]
+        ledger.add_count(hass, alice, "Bier", 3)
+        # The total sensor reads the amount before any prices are known.
+        assert ledger.amount_due(hass, alice) == 0.0
+
+        price_list = types.SimpleNamespace(
+            entry_id="p",
+            version=2,
+            data={
+                const.CONF_USER: const.PRICE_LIST_USER_EN,
+                const.CONF_DRINKS: {"Bier": 2.0},
+                const.CONF_FREE_AMOUNT: 0.0,
+            },
+        )
+        assert await integration.async_setup_entry(hass, price_list)
+
+        assert ledger.amount_due(hass, alice) == 6.0
+        ledger.add_count(hass, alice, "Bier", 1)
+        assert ledger.amount_due(hass, alice) == 8.0
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_migrate_entry_writes_once(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.data[const.DOMAIN]["drinks"] = {"Bier": 2.0}
+        updates = []
+
+        def _update_entry(entry, data=None, version=None):
+            updates.append(dict(data))
+            entry.data = data
+            if version is not None:
+                entry.version = version
+            return True
+
+        hass.config_entries.async_update_entry = _update_entry
+        hass.config_entries.async_forward_entry_setups = AsyncMock()
+        entry = types.SimpleNamespace(
+            entry_id="a",
+            version=1,
+            data={
+                const.CONF_USER: "Alice",
+                const.CONF_USER_PIN: "hashed",
+                const.CONF_LOG_DRINKS: False,
+            },
+        )
+
+        assert await integration.async_migrate_entry(hass, entry)
+        assert entry.version == 2
+        assert len(updates) == 1
+        assert const.CONF_USER_PIN not in entry.data
+        assert entry.data[const.CONF_DRINKS] == {"Bier": 2.0}
+        assert entry.data[const.CONF_LOG_DRINKS] is False
+        assert entry.data[const.CONF_CASH_USER_NAME] == (
+            hass.data[const.DOMAIN][const.CONF_CASH_USER_NAME]
+        )
+        assert hass.data[const.DOMAIN][const.CONF_USER_PINS] == {"Alice": "hashed"}
+
+        # Setting up the migrated entry does not write it again.
+        assert await integration.async_setup_entry(hass, entry)
+        assert len(updates) == 1
+        assert hass.data[const.DOMAIN][const.CONF_LOG_DRINKS] is False
+
+        entry.version = 3
+        assert not await integration.async_migrate_entry(hass, entry)
+    finally:
+        cleanup()
+
+
+@pytest.mark.asyncio
+async def test_migrate_entry_without_shared_options_writes_once(tmp_path):
+    hass, integration, const, utils, cleanup = setup_env(tmp_path)
+    try:
+        await integration.async_setup(hass, {})
+        hass.config_entries.async_update_entry = MagicMock(
+            side_effect=lambda entry, data=None, version=None: setattr(
+                entry, "data", data
+            )
+        )
+        hass.config_entries.async_forward_entry_setups = AsyncMock()
+        price_list = types.SimpleNamespace(
+            entry_id="p",
+            version=2,
+            data={
+                const.CONF_USER: const.PRICE_LIST_USER_EN,
+                const.CONF_DRINKS: {"Bier": 2.0},
+                const.CONF_FREE_AMOUNT: 10.0,
+                const.CONF_EXCLUDED_USERS: ["Guest"],
+            },
+        )
+        assert await integration.async_setup_entry(hass, price_list)
+        hass.config_entries.async_update_entry.reset_mock()
+
+        # The runtime cash user name still follows the language at startup.
+        hass.config.language = "de"
+        # An old entry that only knows its user and a PIN.
+        entry = types.SimpleNamespace(
+            entry_id="a",
+            version=1,
+            data={const.CONF_USER: "Alice", const.CONF_USER_PIN: "hashed"},
+        )
+        assert await integration.async_migrate_entry(hass, entry)
+        assert await integration.async_setup_entry(hass, entry)
+
+        hass.config_entries.async_update_entry.assert_called_once()
+        assert entry.data[const.CONF_DRINKS] == {"Bier": 2.0}
+        assert entry.data[const.CONF_FREE_AMOUNT] == 10.0
+        assert entry.data[const.CONF_EXCLUDED_USERS] == ["Guest"]
+        assert const.CONF_USER_PIN not in entry.data
+    finally:
+        cleanup()
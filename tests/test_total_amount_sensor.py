@@ -70,6 +70,7 @@ class HomeAssistant:  # pragma: no cover - simple stub
 
 
 core_mod.HomeAssistant = HomeAssistant
+core_mod.callback = lambda func: func
 util_mod = types.ModuleType("homeassistant.util")
 
 
@@ -259,6 +260,79 @@ def test_free_drink_feed_sensor_icon():
     assert sensor.icon == "mdi:clipboard-list"
 
 
+def _write_log(path, header, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [";".join(header)] + [";".join(row) for row in rows]
+    path.write_bytes(("\r\n".join(lines) + "\r\n").encode("utf-8"))
+
+
+def test_free_drink_feed_sensor_reads_newest_entries(tmp_path):
+    entry = DummyConfigEntry("id7", "Cash")
+    hass = DummyHass({DOMAIN: {}})
+    hass.config.path = lambda *parts: str(tmp_path.joinpath(*parts))
+    base = tmp_path / "tally_list" / "free_drinks"
+    header = ["Uhrzeit", "Name", "Getränke mit Anzahl", "Kommentar"]
+    _write_log(
+        base / "free_drinks_2024.csv",
+        header,
+        [["2024-12-31T23:59", "Old", "Bier x1", "old"]],
+    )
+    _write_log(
+        base / "free_drinks_2025.csv",
+        header,
+        [
+            [f"2025-01-01T10:{i % 60:02d}", f"User {i}", "Bier x1, Limo x2", "party"]
+            for i in range(500)
+        ]
+        + [["broken"]],
+    )
+    sensor = FreeDrinkFeedSensor(hass, entry, max_entries=3)
+    signature, entries = sensor._read_entries(None)
+    assert [e["name"] for e in entries] == ["User 499", "User 498", "User 497"]
+    assert entries[0]["drinks"] == "Bier ×1 • Limo ×2"
+    assert sensor._read_entries(signature) == (signature, None)
+
+    sensor = FreeDrinkFeedSensor(hass, entry, max_entries=600)
+    _, entries = sensor._read_entries(None)
+    assert len(entries) == 501
+    assert entries[-1]["name"] == "Old"
+
+
+def test_price_list_feed_sensor_stops_after_max_entries(tmp_path):
+    entry = DummyConfigEntry("id8", "Preisliste")
+    hass = DummyHass({DOMAIN: {}})
+    hass.config.path = lambda *parts: str(tmp_path.joinpath(*parts))
+    base = tmp_path / "tally_list" / "price_list"
+    header = ["Time", "User", "Action", "Details"]
+    _write_log(
+        base / "price_list_2024.csv",
+        header,
+        [["2024-06-01T12:00", "Admin", "edit_drink", "Bier:1.5->1.6"]],
+    )
+    _write_log(
+        base / "price_list_2025.csv",
+        header,
+        [["2025-02-01T12:00", "Alice", "add_drink", "Alice:Bier+1"]]
+        + [["bad-time", "Alice", "add_drink", "Alice:Bier+1"]],
+    )
+    sensor = PriceListFeedSensor(hass, entry, max_entries=2)
+    _, entries = sensor._read_entries(None)
+    assert entries == [
+        {
+            "time_local": "2025-02-01 12:00",
+            "user": "Alice",
+            "action": "add_drink",
+            "details": "Alice:Bier+1",
+        },
+        {
+            "time_local": "2024-06-01 12:00",
+            "user": "Admin",
+            "action": "edit_drink",
+            "details": "Bier:1.5->1.6",
+        },
+    ]
+
+
 def test_price_list_feed_sensor_icon():
     entry = DummyConfigEntry("id6", "Preisliste")
     hass = DummyHass({DOMAIN: {}})
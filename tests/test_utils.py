@@ -3,8 +3,32 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1] / "custom_components" / "tally_list"))
 
-from const import DOMAIN, CONF_CASH_USER_NAME, CASH_USER_SLUG
-from utils import get_person_name, get_user_slug
+from const import (
+    DOMAIN,
+    CONF_CASH_USER_NAME,
+    CONF_OVERRIDE_USERS,
+    CONF_PUBLIC_DEVICES,
+    CONF_USER,
+    CASH_USER_SLUG,
+)
+from utils import (
+    PERMISSIONS_KEY,
+    PERSON_CACHE_KEY,
+    access_set,
+    build_person_cache,
+    find_user_entry,
+    get_person_name,
+    get_user_permissions,
+    get_user_slug,
+    refresh_access_lists,
+    iter_csv_rows_reversed,
+    read_last_csv_row,
+    register_user_entry,
+    rewrite_csv_tail,
+    unregister_user_entry,
+    update_person_cache,
+    user_entries,
+)
 
 
 class DummyState:
@@ -43,6 +67,71 @@ def test_get_person_name_no_user_id():
     assert get_person_name(hass, None) is None
 
 
+def test_get_person_name_uses_cache():
+    hass = DummyHass([DummyState("Alice", "user-1"), DummyState("Guest", None)])
+    assert build_person_cache(hass) == {"user-1": "Alice"}
+    hass.states = DummyStates([])
+    assert get_person_name(hass, "user-1") == "Alice"
+    assert get_person_name(hass, "user-2") is None
+
+
+def test_update_person_cache():
+    hass = DummyHass([])
+    build_person_cache(hass)
+    bob = DummyState("Bob", "user-2")
+    update_person_cache(hass, None, bob)
+    assert get_person_name(hass, "user-2") == "Bob"
+
+    robert = DummyState("Robert", "user-2")
+    update_person_cache(hass, bob, robert)
+    assert get_person_name(hass, "user-2") == "Robert"
+
+    moved = DummyState("Robert", "user-3")
+    update_person_cache(hass, robert, moved)
+    assert hass.data[DOMAIN][PERSON_CACHE_KEY] == {"user-3": "Robert"}
+
+    update_person_cache(hass, moved, None)
+    assert hass.data[DOMAIN][PERSON_CACHE_KEY] == {}
+
+
+def test_user_permissions_table():
+    hass = DummyHass(
+        [DummyState("Alice", "user-1"), DummyState("Tablet", "user-2")],
+        {DOMAIN: {CONF_OVERRIDE_USERS: ["Alice"], CONF_PUBLIC_DEVICES: ["Tablet"]}},
+    )
+    build_person_cache(hass)
+    assert get_user_permissions(hass, "user-1") == {
+        "name": "Alice",
+        "admin": True,
+        "public": False,
+    }
+    assert get_user_permissions(hass, "user-2")["public"] is True
+    assert get_user_permissions(hass, "user-3") is None
+    assert get_user_permissions(hass, None) is None
+
+    # The table is reused until persons or the lists change.
+    hass.data[DOMAIN][CONF_OVERRIDE_USERS] = []
+    assert get_user_permissions(hass, "user-1")["admin"] is True
+    refresh_access_lists(hass)
+    assert get_user_permissions(hass, "user-1")["admin"] is False
+    assert access_set(hass, CONF_OVERRIDE_USERS) == frozenset()
+    assert access_set(hass, CONF_PUBLIC_DEVICES) == {"Tablet"}
+
+    update_person_cache(hass, None, DummyState("Bob", "user-3"))
+    assert get_user_permissions(hass, "user-3")["name"] == "Bob"
+
+    # Location updates keep the cached table.
+    table = hass.data[DOMAIN][PERMISSIONS_KEY]
+    home = DummyState("Bob", "user-3")
+    away = DummyState("Bob", "user-3")
+    away.attributes["source"] = "device_tracker.bob_phone"
+    update_person_cache(hass, home, away)
+    assert hass.data[DOMAIN][PERMISSIONS_KEY] is table
+    update_person_cache(hass, away, DummyState("Robert", "user-3"))
+    assert PERMISSIONS_KEY not in hass.data[DOMAIN]
+    assert get_user_permissions(hass, "user-3")["name"] == "Robert"
+
+
 def test_get_user_slug_regular():
     hass = DummyHass([], {DOMAIN: {CONF_CASH_USER_NAME: "Cash"}})
     assert get_user_slug(hass, "John Doe") == "john_doe"
@@ -52,3 +141,86 @@ def test_get_user_slug_cash_user():
     hass = DummyHass([], {DOMAIN: {CONF_CASH_USER_NAME: "Cash"}})
     assert get_user_slug(hass, "cash") == CASH_USER_SLUG
 
+
+def test_read_last_csv_row_empty_file(tmp_path):
+    path = tmp_path / "log.csv"
+    path.write_bytes(b"")
+    assert read_last_csv_row(str(path)) == (0, None)
+
+
+def test_read_last_csv_row_header_only(tmp_path):
+    path = tmp_path / "log.csv"
+    path.write_text("Time;User\r\n", encoding="utf-8")
+    assert read_last_csv_row(str(path)) == (0, ["Time", "User"])
+
+
+def test_read_last_csv_row_returns_tail(tmp_path):
+    path = tmp_path / "log.csv"
+    lines = ["Time;User"] + [f"2025-01-01T00:{i % 60:02d};Üser {i}" for i in range(2000)]
+    content = "\r\n".join(lines) + "\r\n"
+    path.write_text(content, encoding="utf-8")
+    offset, row = read_last_csv_row(str(path))
+    assert row == ["2025-01-01T00:19", "Üser 1999"]
+    assert path.read_bytes()[offset:].decode("utf-8") == lines[-1] + "\r\n"
+
+
+def test_rewrite_csv_tail_keeps_previous_rows(tmp_path):
+    path = tmp_path / "log.csv"
+    path.write_text("Time;User\r\na;1\r\nb;2\r\n", encoding="utf-8")
+    offset, row = read_last_csv_row(str(path))
+    rewrite_csv_tail(str(path), offset, [[row[0], "3"], ["c", "4"]])
+    assert path.read_bytes().decode("utf-8") == "Time;User\r\na;1\r\nb;3\r\nc;4\r\n"
+
+
+def test_rewrite_csv_tail_new_file(tmp_path):
+    path = tmp_path / "log.csv"
+    rewrite_csv_tail(str(path), 0, [["Time", "User"], ["a", "x;y"]])
+    assert path.read_bytes().decode("utf-8") == 'Time;User\r\na;"x;y"\r\n'
+
+
+def test_iter_csv_rows_reversed(tmp_path):
+    path = tmp_path / "log.csv"
+    lines = ["Time;Name"] + [f"t{i};Ä{i}" for i in range(3000)]
+    path.write_bytes(("\r\n".join(lines) + "\r\n").encode("utf-8"))
+    rows = list(iter_csv_rows_reversed(str(path)))
+    assert rows[0] == ["t2999", "Ä2999"]
+    assert rows[-1] == ["t0", "Ä0"]
+    assert len(rows) == 3000
+
+
+def test_iter_csv_rows_reversed_header_only(tmp_path):
+    path = tmp_path / "log.csv"
+    path.write_text("Time;Name\r\n", encoding="utf-8")
+    assert list(iter_csv_rows_reversed(str(path))) == []
+
+
+class DummyEntry:
+    def __init__(self, user):
+        self.data = {CONF_USER: user}
+
+
+def test_user_index_lookup():
+    hass = DummyHass([], {DOMAIN: {}})
+    alice = {"entry": DummyEntry("Alice")}
+    cash = {"entry": DummyEntry(" Free Drinks ")}
+    register_user_entry(hass, alice)
+    register_user_entry(hass, cash)
+    assert find_user_entry(hass, "Alice") is alice
+    assert find_user_entry(hass, "alice") is None
+    assert find_user_entry(hass, "free drinks", normalized=True) is cash
+    assert user_entries(hass) == [alice, cash]
+
+    unregister_user_entry(hass, alice)
+    assert find_user_entry(hass, "Alice") is None
+    assert find_user_entry(hass, "alice", normalized=True) is None
+    assert user_entries(hass) == [cash]
+
+
+def test_unregister_keeps_newer_entry():
+    hass = DummyHass([], {DOMAIN: {}})
+    old = {"entry": DummyEntry("Alice")}
+    new = {"entry": DummyEntry("Alice")}
+    register_user_entry(hass, old)
+    register_user_entry(hass, new)
+    unregister_user_entry(hass, old)
+    assert find_user_entry(hass, "Alice") is new